@@ -4,7 +4,17 @@ __version__ = "0.2.7"
 
 _EXPORT_MAP = {
     "tokenize": (".tokenizer", "tokenize"),
+    "iter_tokenize": (".tokenizer", "iter_tokenize"),
+    "tokenize_spans": (".tokenizer", "tokenize_spans"),
+    "TokenSpan": (".offsets", "TokenSpan"),
+    "iter_token_batches": (".tokenizer", "iter_token_batches"),
+    "TokenBatch": (".token_batch", "TokenBatch"),
+    "Tag": (".token_batch", "Tag"),
     "TSTokenizer": (".tokenizer", "TSTokenizer"),
+    "atokenize": (".aio", "atokenize"),
+    "atokenize_many": (".aio", "atokenize_many"),
+    "aiter_tokenize": (".aio", "aiter_tokenize"),
+    "AsyncTokenizer": (".aio", "AsyncTokenizer"),
     "CharFix": (".char_fix", "CharFix"),
     "fix": (".char_fix", "fix"),
     "tr_lowercase": (".char_fix", "tr_lowercase"),
@@ -44,7 +54,17 @@ def __dir__():
 __all__ = [
     "__version__",
     "tokenize",
+    "iter_tokenize",
+    "tokenize_spans",
+    "TokenSpan",
+    "iter_token_batches",
+    "TokenBatch",
+    "Tag",
     "TSTokenizer",
+    "atokenize",
+    "atokenize_many",
+    "aiter_tokenize",
+    "AsyncTokenizer",
     "CharFix",
     "fix",
     "tr_lowercase",
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import collections
+import multiprocessing
+
+from ts_tokenizer.tokenizer import tokenize_lines, tokenize_tokens_chunk, tokenize_batch, DEFAULT_CHUNK_SIZE
+from ts_tokenizer.worker_pool import create_executor, DEFAULT_BACKEND
+
+DEFAULT_BATCH_DELAY = 0.002  # seconds a request may wait for others to share its batch
+
+
+async def _achunks(lines, chunk_size):
+    """
+    Groups an async or a regular iterable of lines into lists of at most chunk_size lines.
+    """
+    chunk = []
+    if hasattr(lines, '__aiter__'):
+        async for line in lines:
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    else:
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class AsyncTokenizer:
+    """
+    Tokenizes from asyncio code without blocking the event loop. The CPU work runs on a worker pool of
+    the given backend (processes by default) that is started on first use and shut down by close().
+    Concurrent single-line calls with the same format are collected for up to batch_delay seconds, or
+    until max_batch_lines lines are waiting, and sent to the workers as one task. Cancelling a call drops
+    its line from the batch, and a batch whose callers were all cancelled is cancelled too if no worker
+    picked it up yet.
+    """
+
+    def __init__(self, num_workers=None, max_batch_lines=DEFAULT_CHUNK_SIZE, batch_delay=DEFAULT_BATCH_DELAY,
+                 start_method=None, backend=DEFAULT_BACKEND):
+        if backend == 'serial':
+            num_workers = 1
+        elif num_workers is None:
+            num_workers = max(multiprocessing.cpu_count() - 1, 1)
+        if max_batch_lines < 1:
+            raise ValueError(f"max_batch_lines must be a positive integer, got {max_batch_lines}")
+        self.num_workers = num_workers
+        self.max_batch_lines = max_batch_lines
+        self.batch_delay = batch_delay
+        self.start_method = start_method
+        self.backend = backend
+        self._executor = None
+        self._batches = {}
+        self._flush_handle = None
+        # Counters for monitoring, e.g. by the tokenization server
+        self.waiting = 0
+        self.in_flight = 0
+        self.batches = 0
+        self.batched_lines = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = create_executor(self.num_workers, self.start_method, self.backend)
+        return self._executor
+
+    @property
+    def queue_depth(self):
+        """
+        Lines that wait for their batch to be sent plus lines that are being tokenized.
+        """
+        return self.waiting + self.in_flight
+
+    async def tokenize(self, line, return_format='tokenized', output=False):
+        """
+        Async counterpart of tokenize(): returns the same result for a single line.
+        """
+        return await self._submit(line, tokenize_lines, (return_format, output))
+
+    async def tokenize_tokens(self, line):
+        """
+        Returns the (token, tag) tuples of a single line like iter_tokenize(), batched with concurrent calls.
+        """
+        return await self._submit(line, tokenize_tokens_chunk, ())
+
+    async def _submit(self, line, func, args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (func, args)
+        batch = self._batches.setdefault(key, [])
+        batch.append((line, future))
+        self.waiting += 1
+        if len(batch) >= self.max_batch_lines:
+            self._dispatch(key)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        return await future
+
+    async def tokenize_many(self, lines, return_format='tokenized', output=False, chunk_size=None):
+        """
+        Tokenizes a list of lines in chunks spread over the workers and returns one result per line.
+        """
+        loop = asyncio.get_running_loop()
+        chunk_size = chunk_size or self.max_batch_lines
+        lines = list(lines)
+        futures = [loop.run_in_executor(self.executor, tokenize_lines, lines[start:start + chunk_size],
+                                        return_format, output)
+                   for start in range(0, len(lines), chunk_size)]
+        try:
+            chunks = await asyncio.gather(*futures)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        results = []
+        for chunk in chunks:
+            for result in chunk:
+                if isinstance(result, Exception):
+                    raise result
+                results.append(result)
+        return results
+
+    async def iter_tokenize(self, lines, chunk_size=None, max_in_flight=None):
+        """
+        Async counterpart of iter_tokenize(): reads an async (or regular) iterable of lines and yields one list
+        of (token, tag) tuples per line, in input order. At most max_in_flight chunks are pending at a time,
+        and pending chunks are cancelled when the iteration is closed or cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        chunk_size = chunk_size or self.max_batch_lines
+        max_in_flight = max_in_flight or 2 * self.num_workers
+        pending = collections.deque()
+        try:
+            async for chunk in _achunks(lines, chunk_size):
+                pending.append((chunk, loop.run_in_executor(self.executor, tokenize_batch, chunk)))
+                while len(pending) >= max_in_flight:
+                    for tokens in await self._collect(*pending.popleft()):
+                        yield tokens
+            while pending:
+                for tokens in await self._collect(*pending.popleft()):
+                    yield tokens
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    @staticmethod
+    async def _collect(chunk, future):
+        try:
+            return (await future).tolist()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The chunk failed and was logged, keep one entry per input line like iter_tokenize
+            logging.error(f"Error processing chunk: {e}", exc_info=True)
+            return [[] for _ in chunk]
+
+    def _flush(self):
+        self._flush_handle = None
+        for key in list(self._batches):
+            self._dispatch(key)
+
+    def _dispatch(self, key):
+        batch = self._batches.pop(key, [])
+        self.waiting -= len(batch)
+        batch = [(line, future) for line, future in batch if not future.done()]
+        # Spread the batch over the workers, so that one worker does not hold all the waiting lines
+        size = -(-len(batch) // self.num_workers)
+        for start in range(0, len(batch), size or 1):
+            self._send(batch[start:start + size], *key)
+
+    def _send(self, batch, func, args):
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self.executor, func, [line for line, _ in batch], *args)
+        self.in_flight += len(batch)
+        self.batches += 1
+        self.batched_lines += len(batch)
+
+        def deliver(task):
+            self.in_flight -= len(batch)
+            if task.cancelled():
+                for _, future in batch:
+                    future.cancel()
+                return
+            error = task.exception()
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                elif isinstance(task.result()[index], Exception):
+                    future.set_exception(task.result()[index])
+                else:
+                    future.set_result(task.result()[index])
+
+        def cancelled(_):
+            if all(future.cancelled() for _, future in batch):
+                task.cancel()
+
+        task.add_done_callback(deliver)
+        for _, future in batch:
+            future.add_done_callback(cancelled)
+
+    def close(self):
+        """
+        Shuts down the process pool. Waiting calls are cancelled.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for batch in self._batches.values():
+            for _, future in batch:
+                future.cancel()
+        self._batches.clear()
+        self.waiting = 0
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_default_tokenizer = None
+
+
+def default_tokenizer():
+    """
+    Returns the AsyncTokenizer shared by atokenize(), atokenize_many() and aiter_tokenize().
+    """
+    global _default_tokenizer
+    if _default_tokenizer is None:
+        _default_tokenizer = AsyncTokenizer()
+    return _default_tokenizer
+
+
+async def atokenize(line, return_format='tokenized', output=False):
+    """
+    Tokenizes a single line on the shared process pool, batched with concurrent calls.
+    """
+    return await default_tokenizer().tokenize(line, return_format, output)
+
+
+async def atokenize_many(lines, return_format='tokenized', output=False):
+    """
+    Tokenizes a list of lines on the shared process pool and returns one result per line.
+    """
+    return await default_tokenizer().tokenize_many(lines, return_format, output)
+
+
+async def aiter_tokenize(lines, chunk_size=DEFAULT_CHUNK_SIZE, max_in_flight=None):
+    """
+    Yields one list of (token, tag) tuples per line of an async or regular line source.
+    """
+    async for tokens in default_tokenizer().iter_tokenize(lines, chunk_size, max_in_flight):
+        yield tokens
+
+
+__all__ = ["AsyncTokenizer", "atokenize", "atokenize_many", "aiter_tokenize", "default_tokenizer"]
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import logging
+import itertools
+
+CHECKPOINT_VERSION = 1
+DEFAULT_CHECKPOINT_INTERVAL = 60  # seconds
+
+
+def default_checkpoint_path(output_file=None, output_dir=None):
+    """
+    Returns the checkpoint file used for an output file or directory, e.g. out.txt -> out.txt.checkpoint.
+    """
+    if output_file:
+        return f"{output_file}.checkpoint"
+    if output_dir:
+        return f"{os.path.normpath(output_dir)}.checkpoint"
+    raise ValueError("Checkpoints need an output file or an output directory")
+
+
+class Checkpoint:
+    """
+    Records how many chunks have been written, how far the input has been read and where the output
+    stood at that point, so that an interrupted run can continue right after the last committed chunk.
+    The output is synced to disk before the checkpoint file is replaced, so the output always holds at
+    least what the checkpoint says and anything after it is truncated on resume.
+    """
+
+    def __init__(self, path, config, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        # Round trip through JSON, so that the config compares equal to a loaded one
+        self.config = json.loads(json.dumps(config))
+        self.interval = interval
+        self.chunks = 0
+        self.input_position = 0
+        self.output = None
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def open(cls, path, config, resume=False, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        Creates the checkpoint of a run. With resume, the state of an existing checkpoint file is loaded
+        after checking that it was written by a run with the same inputs and options.
+        """
+        checkpoint = cls(path, config, interval)
+        if not resume:
+            return checkpoint
+        if not os.path.exists(path):
+            logging.warning(f"No checkpoint found at {path}, starting from the beginning.")
+            return checkpoint
+
+        with open(path, 'r', encoding='utf-8') as in_file:
+            state = json.load(in_file)
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {path}: {state.get('version')}")
+        if state["config"] != checkpoint.config:
+            changed = sorted(key for key in set(state["config"]) | set(checkpoint.config)
+                             if state["config"].get(key) != checkpoint.config.get(key))
+            raise ValueError(f"Checkpoint {path} was written by a different run, changed: {', '.join(changed)}")
+
+        checkpoint.chunks = state["chunks"]
+        checkpoint.input_position = state["input_position"]
+        checkpoint.output = state["output"]
+        logging.info(f"Resuming from {path} after {checkpoint.chunks} chunks")
+        return checkpoint
+
+    def skip(self, chunks):
+        """
+        Drops the chunks that were already written before the checkpoint.
+        """
+        return itertools.islice(chunks, self.chunks, None) if self.chunks else chunks
+
+    def advance(self, input_size, sync):
+        """
+        Counts a written chunk and saves the checkpoint once the interval has passed. sync flushes the
+        output to disk and returns its position.
+        """
+        self.chunks += 1
+        self.input_position += input_size
+        if time.monotonic() - self._saved_at >= self.interval:
+            self.save(sync())
+
+    def save(self, output):
+        self.output = output
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "config": self.config,
+            "chunks": self.chunks,
+            "input_position": self.input_position,
+            "output": output,
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as out_file:
+            json.dump(state, out_file, ensure_ascii=False)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(temp_path, self.path)
+        self._saved_at = time.monotonic()
+        logging.debug(f"Checkpoint saved after {self.chunks} chunks")
+
+    def finish(self):
+        """
+        Removes the checkpoint file once the run is complete.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+__all__ = ["Checkpoint", "default_checkpoint_path", "DEFAULT_CHECKPOINT_INTERVAL"]
@@ -1,6 +1,12 @@
+import io
 import sys
 import argparse
 from ts_tokenizer.tokenizer import TSTokenizer
+from ts_tokenizer.corpus import is_corpus_input
+from ts_tokenizer.compressed_io import open_binary_input
+from ts_tokenizer.worker_pool import BACKENDS, DEFAULT_BACKEND
+from ts_tokenizer.token_ids import DEFAULT_HASH_BITS
+from ts_tokenizer.token_cache import DEFAULT_CACHE_SIZE
 from ts_tokenizer import __version__
 
 
@@ -11,20 +17,79 @@ def build_parser():
     )
 
 
+def parse_size(value):
+    """
+    Parses a byte count with an optional K, M or G suffix.
+    """
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    value = value.strip().upper().rstrip('B')
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+
+
 def configure_parser(parser):
     parser.add_argument(
         'filename',
-        nargs='?',
-        help="Name of the file to process (optional if input is piped)"
+        nargs='*',
+        help="Files, directories, glob patterns or @list files to process (optional if input is piped)"
     )
     parser.add_argument(
         '-o', '--output',
-        choices=['tokenized', 'lines', 'tagged', 'tagged_lines'],
+        choices=['tokenized', 'lines', 'tagged', 'tagged_lines', 'conllu', 'vrt', 'ids'],
         default='tokenized',
         help="Specify the output format"
     )
-    parser.add_argument('-v', '--verbose', action='store_true', help="Enable verbose mode")
+    parser.add_argument('--jsonl', action='store_true',
+                        help="Write every line as a JSON value (with -o tagged, lines or tagged_lines)")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="Show progress with throughput and worker utilisation on stderr")
     parser.add_argument('-n', '--num-workers', type=int, help="Number of parallel workers", default=None)
+    parser.add_argument('-c', '--chunk-size', type=int, help="Number of lines sent to a worker per task", default=None)
+    parser.add_argument('--in-flight', type=int, help="Maximum number of chunks queued for the workers", default=None)
+    parser.add_argument('-u', '--unordered', action='store_true',
+                        help="Emit chunks as soon as they finish, prefixed with their sequence number")
+    parser.add_argument('--output-file', help="Write the output to this file instead of stdout", default=None)
+    parser.add_argument('--rotate-bytes', type=parse_size, default=None,
+                        help="Start a new numbered part file after this many bytes (e.g. 512M)")
+    parser.add_argument('--rotate-lines', type=int, default=None,
+                        help="Start a new numbered part file after this many output lines")
+    parser.add_argument('--mmap', action='store_true',
+                        help="Memory map the input file and let workers read their own byte ranges")
+    parser.add_argument('--range-size', type=parse_size, default=None,
+                        help="Size of the byte range read by a worker in --mmap and --documents mode (e.g. 4M)")
+    parser.add_argument('--documents', action='store_true',
+                        help="Send whole XML/VRT documents (<doc>, <text>) to the workers, splitting only "
+                             "documents larger than --range-size at <p> tags")
+    parser.add_argument('--output-dir', default=None,
+                        help="Write the output of each input file to the same relative path in this directory")
+    parser.add_argument('--batch-bytes', type=parse_size, default=None,
+                        help="Batch small corpus files together until a task holds this many bytes (e.g. 1M)")
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Run the workers as processes, threads, subinterpreters (Python 3.14+) or serially")
+    parser.add_argument('--hash-bits', type=int, default=None,
+                        help=f"With -o ids, hash tokens to IDs of this many bits (e.g. {DEFAULT_HASH_BITS}) "
+                             "instead of building a vocabulary")
+    parser.add_argument('--shard-tokens', type=int, default=None,
+                        help="With -o ids, start a new shard after this many tokens (default: 16M)")
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help=f"Number of analysed tokens every worker keeps in its cache, 0 to disable "
+                             f"(default: {DEFAULT_CACHE_SIZE})")
+    parser.add_argument('--disk-cache', default=None,
+                        help="Share token analyses between workers and runs through this SQLite file, which is "
+                             "rebuilt when the lexicons or the package version change")
+    parser.add_argument('--start-method', choices=['fork', 'forkserver', 'spawn'], default=None,
+                        help="How worker processes are started (default: the program's start method or the platform "
+                             "default, forkserver instead of a default of spawn)")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Record progress in this file, so that an interrupted run can be resumed")
+    parser.add_argument('--checkpoint-interval', type=float, default=None,
+                        help="Seconds between checkpoint saves (default: 60)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from its checkpoint (default: <output-file>.checkpoint)")
 
     # Add version argument
     parser.add_argument(
@@ -42,17 +107,58 @@ def create_parser():
     return configure_parser(parser)
 
 
+def stdin_ready():
+    """
+    Returns whether anything was piped in, waiting for the first bytes of stdin without consuming them.
+    """
+    buffer = getattr(sys.stdin, 'buffer', None)
+    # peek() blocks until the first bytes arrive
+    return buffer is None or not hasattr(buffer, 'peek') or bool(buffer.peek(1))
+
+
+def stdin_lines():
+    """
+    Returns stdin as an incrementally read UTF-8 text stream. Compressed input (gzip, bz2, xz, zstd) is
+    detected from its first bytes and decompressed on the fly in a background thread, so worker processes
+    must be forked before this is called: see run().
+    """
+    buffer = getattr(sys.stdin, 'buffer', None)
+    if buffer is None:
+        return sys.stdin
+    return io.TextIOWrapper(open_binary_input(buffer), encoding='utf-8')
+
+
 def run(args):
-    # Case 1: Piped input detected
-    if not sys.stdin.isatty():
-        input_text = sys.stdin.read().strip()
-        if not input_text:
-            print("Error: No input received from stdin.", file=sys.stderr)
-            return 1
+    if args.jsonl and args.output not in ('tagged', 'lines', 'tagged_lines'):
+        print("Error: --jsonl needs -o tagged, lines or tagged_lines", file=sys.stderr)
+        return 1
 
+    options = dict(output_format=args.output, output=args.jsonl, num_workers=args.num_workers, verbose=args.verbose,
+                   chunk_size=args.chunk_size, max_in_flight=args.in_flight, ordered=not args.unordered,
+                   output_file=args.output_file, rotate_bytes=args.rotate_bytes, rotate_lines=args.rotate_lines,
+                   start_method=args.start_method, backend=args.backend, documents=args.documents)
+
+    if args.range_size:
+        options.update(range_size=args.range_size)
+    if args.checkpoint or args.resume:
+        options.update(checkpoint=args.checkpoint, resume=args.resume)
+    if args.hash_bits is not None:
+        options.update(hash_bits=args.hash_bits)
+    if args.shard_tokens is not None:
+        options.update(shard_tokens=args.shard_tokens)
+    if args.cache_size is not None:
+        options.update(cache_size=args.cache_size)
+    if args.disk_cache:
+        options.update(disk_cache=args.disk_cache)
+    if args.checkpoint_interval is not None:
+        options.update(checkpoint_interval=args.checkpoint_interval)
+
+    # Case 1: Several files, a directory, a glob pattern or an output directory
+    if args.filename and (args.output_dir or is_corpus_input(args.filename)):
+        if args.batch_bytes:
+            options.update(batch_bytes=args.batch_bytes)
         try:
-            # Tokenize the input text from stdin
-            TSTokenizer.ts_tokenize(input_file=input_text, output_format=args.output, num_workers=args.num_workers)
+            TSTokenizer.ts_tokenize(inputs=args.filename, output_dir=args.output_dir, **options)
         except Exception as e:
             print(f"Error: {e}", file=sys.stderr)
             return 1
@@ -60,12 +166,33 @@ def run(args):
     # Case 2: Filename provided
     elif args.filename:
         try:
-            TSTokenizer.ts_tokenize(filename=args.filename, output_format=args.output, num_workers=args.num_workers)
+            TSTokenizer.ts_tokenize(filename=args.filename[0], mmap_input=args.mmap, **options)
         except Exception as e:
             print(f"Error: {e}", file=sys.stderr)
             return 1
 
-    # Case 3: No input provided
+    # Case 3: Piped input detected
+    elif not sys.stdin.isatty():
+        if not stdin_ready():
+            print("Error: No input received from stdin.", file=sys.stderr)
+            return 1
+
+        try:
+            # Stream stdin through the same worker pool as file input. The pool is started first: a worker
+            # forked while the thread that decompresses stdin holds the lock of sys.stdin.buffer would block
+            # on that lock for good when it closes its copy of stdin.
+            # The tokenizer holds the cache settings while its pool runs
+            with TSTokenizer(args.num_workers, start_method=args.start_method, backend=args.backend,
+                             cache_size=options.pop('cache_size', None),
+                             disk_cache=options.pop('disk_cache', None)) as tokenizer:
+                options.update(num_workers=tokenizer.num_workers)
+                executor = tokenizer.executor
+                TSTokenizer.ts_tokenize(input_file=stdin_lines(), executor=executor, **options)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    # Case 4: No input provided
     else:
         print("Usage: ts-tokenizer [arguments] <filename> or pipe input via stdin (e.g., cat file.txt | ts-tokenizer)")
         return 1
@@ -74,6 +201,12 @@ def run(args):
 
 
 def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # `ts-tokenizer serve ...` starts the tokenization server
+    if argv and argv[0] == 'serve':
+        from ts_tokenizer.server import main as serve_main
+        return serve_main(argv[1:])
+
     parser = create_parser()
     args = parser.parse_args(argv)
     return run(args)
@@ -0,0 +1,251 @@
+import io
+import os
+import bz2
+import gzip
+import lzma
+import queue
+import logging
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+DEFAULT_BLOCK_SIZE = 1 << 20  # 1 MiB
+DEFAULT_PREFETCH_BLOCKS = 8
+
+MAGIC_BYTES = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".lzma": "xz",
+    ".zst": "zstd",
+}
+
+
+def detect_compression(path=None, head=None):
+    """
+    Returns the compression of a file or stream head ("gzip", "bz2", "xz", "zstd") from its magic bytes,
+    or None for uncompressed data. The extension is only consulted when there are no bytes to look at.
+    """
+    if head is None:
+        with open(path, 'rb') as in_file:
+            head = in_file.read(6)
+    for magic, compression in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    if path is not None and not head:
+        return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    return None
+
+
+def output_compression(path):
+    """
+    Returns the compression used for an output file based on its extension.
+    """
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("zstd support requires the 'zstandard' package: pip install zstandard")
+
+
+OPENERS = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open,
+}
+
+
+def _open_compressed(path, mode, compression):
+    if compression == "zstd":
+        _require_zstandard()
+        return zstandard.open(path, mode)
+    return OPENERS[compression](path, mode)
+
+
+def decompressing_reader(raw, compression):
+    """
+    Wraps a binary stream into a stream of decompressed bytes.
+    """
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if compression == "bz2":
+        return bz2.BZ2File(raw, mode='rb')
+    if compression == "xz":
+        return lzma.LZMAFile(raw, mode='rb')
+    if compression == "zstd":
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=False)
+    return raw
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Reads blocks from a (decompressing) binary stream in a background thread, so that decompression
+    overlaps with tokenization. The zlib, bz2, lzma and zstd codecs release the GIL while they work.
+    """
+
+    def __init__(self, stream, block_size=DEFAULT_BLOCK_SIZE, prefetch_blocks=DEFAULT_PREFETCH_BLOCKS):
+        super().__init__()
+        self.stream = stream
+        self.block_size = block_size
+        self._blocks = queue.Queue(maxsize=prefetch_blocks)
+        self._pending = b""
+        self._offset = 0
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, name="ts-tokenizer-reader", daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                block = self.stream.read(self.block_size)
+                self._put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._offset >= len(self._pending) and not self._eof:
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self._eof = True
+            self._pending = block
+            self._offset = 0
+        size = min(len(buffer), len(self._pending) - self._offset)
+        buffer[:size] = memoryview(self._pending)[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self.stream.close()
+        super().close()
+
+
+class BackgroundWriter(io.RawIOBase):
+    """
+    Hands written blocks to a background thread that compresses and writes them.
+    """
+
+    def __init__(self, stream, prefetch_blocks=DEFAULT_PREFETCH_BLOCKS):
+        super().__init__()
+        self.stream = stream
+        self._blocks = queue.Queue(maxsize=prefetch_blocks)
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, name="ts-tokenizer-writer", daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while True:
+            block = self._blocks.get()
+            if block is None:
+                return
+            if self._error is None:
+                try:
+                    self.stream.write(block)
+                except Exception as e:
+                    self._error = e
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._check()
+        self._blocks.put(bytes(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._blocks.put(None)
+            self._thread.join()
+            self.stream.close()
+            self._check()
+        super().close()
+
+
+def open_binary_input(stream, threaded=True):
+    """
+    Detects the compression of a binary stream from its first bytes and returns a stream of
+    decompressed bytes. The stream must support peek(), as buffered files and sys.stdin.buffer do.
+    """
+    compression = detect_compression(head=stream.peek(6)[:6])
+    if compression is None:
+        return stream
+    logging.debug(f"Decompressing {compression} input")
+    reader = decompressing_reader(stream, compression)
+    return io.BufferedReader(PrefetchReader(reader)) if threaded else reader
+
+
+def open_input(path, threaded=True):
+    """
+    Opens a possibly compressed file as a UTF-8 text stream. Compressed files are decompressed in a
+    background thread when threaded is True.
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'r', encoding='utf-8')
+    logging.debug(f"Decompressing {compression} file: {path}")
+    reader = _open_compressed(path, 'rb', compression)
+    if threaded:
+        reader = io.BufferedReader(PrefetchReader(reader))
+    return io.TextIOWrapper(reader, encoding='utf-8')
+
+
+def open_output(path, threaded=True):
+    """
+    Opens a binary output file, compressed according to its extension (.gz, .bz2, .xz, .zst).
+    Compression runs in a background thread when threaded is True.
+    """
+    compression = output_compression(path)
+    if compression is None:
+        return open(path, 'wb')
+    writer = _open_compressed(path, 'wb', compression)
+    return BackgroundWriter(writer) if threaded else writer
+
+
+def is_compressed(path):
+    return detect_compression(path) is not None
+
+
+__all__ = [
+    "detect_compression",
+    "output_compression",
+    "open_input",
+    "open_binary_input",
+    "open_output",
+    "is_compressed",
+    "PrefetchReader",
+    "BackgroundWriter",
+]
@@ -0,0 +1,161 @@
+import os
+import glob
+import logging
+
+from ts_tokenizer.mmap_input import byte_ranges, DEFAULT_RANGE_SIZE
+from ts_tokenizer.compressed_io import is_compressed
+
+DEFAULT_BATCH_BYTES = 1 << 20  # 1 MiB
+GLOB_CHARS = set('*?[')
+
+
+def is_glob(pattern):
+    return any(char in GLOB_CHARS for char in pattern)
+
+
+def _glob_root(pattern):
+    """
+    Returns the leading directory of a glob pattern that contains no wildcards.
+    """
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep)[:-1]:
+        if is_glob(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) if parts else os.curdir
+
+
+def is_corpus_input(inputs):
+    """
+    Checks whether the inputs need corpus mode, i.e. they are not a single plain file.
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    return len(inputs) != 1 or inputs[0].startswith('@') or is_glob(inputs[0]) or os.path.isdir(inputs[0])
+
+
+def expand_inputs(inputs):
+    """
+    Expands files, directories (recursively), glob patterns and @list files (one path per line) into
+    (path, relative_path) pairs. The relative path is used to mirror the input tree in the output directory.
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    for item in inputs:
+        if item.startswith('@'):
+            with open(item[1:], 'r', encoding='utf-8') as list_file:
+                listed = [line.strip() for line in list_file if line.strip()]
+            yield from expand_inputs(listed)
+        elif os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    yield path, os.path.relpath(path, item)
+        elif is_glob(item):
+            root = _glob_root(item)
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path):
+                    yield path, os.path.relpath(path, root)
+        else:
+            yield item, os.path.basename(item)
+
+
+def check_relpaths(files):
+    """
+    Returns the (path, relative_path) pairs of expand_inputs() as a list, after checking that no two inputs
+    would be written to the same file of the output directory, e.g. a/x.txt and b/x.txt given as files.
+    """
+    files = list(files)
+    seen = {}
+    for path, relpath in files:
+        key = os.path.normcase(os.path.normpath(relpath))
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {path} would both be written to {relpath} in the output directory")
+        seen[key] = path
+    return files
+
+
+def corpus_units(files, batch_bytes=DEFAULT_BATCH_BYTES, range_size=DEFAULT_RANGE_SIZE, split=byte_ranges):
+    """
+    Groups (path, relative_path) pairs into work units of (path, relative_path, start, end) byte ranges.
+    Small files are batched together until a unit holds about batch_bytes, and files larger than
+    range_size are split into ranges by split (newline aligned ranges by default), so every unit is worth
+    a task. Compressed files cannot be split and are read whole by a single worker, marked with an end of None.
+    """
+    unit, unit_bytes = [], 0
+    for path, relpath in files:
+        size = os.path.getsize(path)
+        if size and is_compressed(path):
+            unit.append((path, relpath, 0, None))
+            unit_bytes += size
+        elif size > range_size:
+            if unit:
+                yield unit
+                unit, unit_bytes = [], 0
+            for start, end in split(path, range_size):
+                yield [(path, relpath, start, end)]
+            continue
+        else:
+            unit.append((path, relpath, 0, size))
+            unit_bytes += size
+        if unit_bytes >= batch_bytes:
+            yield unit
+            unit, unit_bytes = [], 0
+    if unit:
+        yield unit
+
+
+class MirroredOutput:
+    """
+    Writes the results of each input file to the same relative path under output_dir.
+    Units arrive in input order, so only one output file is open at a time. resume_from is the
+    position of the file that was open when the checkpoint of an interrupted run was saved.
+    """
+
+    def __init__(self, output_dir, open_sink, resume_from=None):
+        self.output_dir = output_dir
+        self.open_sink = open_sink
+        self.resume_from = resume_from
+        self.relpath = None
+        self.sink = None
+        self.files_written = 0
+
+    def write(self, relpath, result):
+        if relpath != self.relpath:
+            self.close()
+            path = os.path.join(self.output_dir, relpath)
+            os.makedirs(os.path.dirname(path) or os.curdir, exist_ok=True)
+            logging.debug(f"Writing {path}")
+            resume_from = self.resume_from if self.resume_from and self.resume_from["relpath"] == relpath else None
+            self.resume_from = None
+            self.sink = self.open_sink(path, resume_from=resume_from)
+            self.relpath = relpath
+            self.files_written += 1
+        if result is not None:
+            self.sink.write(result)
+
+    def sync(self):
+        """
+        Forces the open output file to disk and returns its position for a checkpoint.
+        """
+        if self.sink is None:
+            return {"relpath": None}
+        return dict(self.sink.sync(), relpath=self.relpath)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+            self.relpath = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+__all__ = ["DEFAULT_BATCH_BYTES", "is_corpus_input", "expand_inputs", "check_relpaths", "corpus_units",
+           "MirroredOutput"]
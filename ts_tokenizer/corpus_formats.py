@@ -0,0 +1,104 @@
+import re
+
+# XML elements that start a new document or paragraph in CoNLL-U
+DOCUMENT_ELEMENTS = ("doc", "text")
+PARAGRAPH_ELEMENTS = ("p",)
+
+OPEN_TAG_RE = re.compile(r'^<\s*(\w+)')
+ID_ATTRIBUTE_RE = re.compile(r'\bid\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+ATTRIBUTE_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+
+def element_id(tag):
+    """
+    Returns the value of the id attribute of an XML open tag, or None.
+    """
+    match = ID_ATTRIBUTE_RE.search(tag)
+    if match is None:
+        return None
+    return match.group(1) if match.group(1) is not None else match.group(2)
+
+
+class ConlluWriter:
+    """
+    Writes sentences as CoNLL-U blocks. The tag of every token goes to the XPOS column and tokens that were
+    attached to the next one in the input get SpaceAfter=No. Document and paragraph open tags become
+    "# newdoc" and "# newpar" comments of the next sentence, other XML tags are dropped.
+    """
+
+    def __init__(self, source=None):
+        self.prefix = f"{source}:" if source else ""
+        self.blocks = []
+        self.comments = []
+
+    def tag(self, tag):
+        match = OPEN_TAG_RE.match(tag)
+        if not match or tag.endswith("/>"):
+            return
+        name = match.group(1)
+        if name in DOCUMENT_ELEMENTS:
+            comment = "# newdoc"
+        elif name in PARAGRAPH_ELEMENTS:
+            comment = "# newpar"
+        else:
+            return
+        tag_id = element_id(tag)
+        self.comments.append(comment if tag_id is None else f"{comment} id = {tag_id}")
+
+    def sentence(self, text, words, offset=None):
+        """
+        Adds a sentence from its text and the (token, tag) tuples of each of its whitespace separated words.
+        """
+        lines = self.comments
+        self.comments = []
+        if offset is not None:
+            lines.append(f"# sent_id = {self.prefix}{offset}")
+        lines.append(f"# text = {text}")
+        index = 0
+        for tokens in words:
+            last = len(tokens) - 1
+            for position, token in enumerate(tokens):
+                index += 1
+                misc = "_" if position == last else "SpaceAfter=No"
+                lines.append(f"{index}\t{token[0]}\t_\t_\t{token[1]}\t_\t_\t_\t_\t{misc}")
+        lines.append("")
+        self.blocks.append("\n".join(lines))
+
+    def getvalue(self):
+        # Comments of a sentence in the next chunk are written last, so they end up right before it
+        parts = self.blocks + ["\n".join(self.comments)] if self.comments else self.blocks
+        return "\n".join(parts) if parts else None
+
+
+class VrtWriter:
+    """
+    Writes sentences in the vertical format of CWB and Sketch Engine: one token<TAB>tag line per token,
+    every sentence in an <s> element. XML tags of the input are kept in place, and tokens are XML escaped.
+    """
+
+    def __init__(self, source=None):
+        self.prefix = f"{source}:".translate(ATTRIBUTE_ESCAPES) if source else ""
+        self.lines = []
+
+    def tag(self, tag):
+        self.lines.append(tag)
+
+    def sentence(self, text, words, offset=None):
+        lines = self.lines
+        lines.append("<s>" if offset is None else f'<s id="{self.prefix}{offset}">')
+        for tokens in words:
+            for token in tokens:
+                lines.append(f"{token[0].translate(XML_ESCAPES)}\t{token[1]}")
+        lines.append("</s>")
+
+    def getvalue(self):
+        return "\n".join(self.lines) if self.lines else None
+
+
+# Output formats written by a stateful writer instead of line by line
+STRUCTURED_FORMATS = {"conllu": ConlluWriter, "vrt": VrtWriter}
+
+
+__all__ = ["ConlluWriter", "VrtWriter", "STRUCTURED_FORMATS", "element_id"]
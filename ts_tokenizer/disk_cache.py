@@ -0,0 +1,215 @@
+import os
+import glob
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+import contextlib
+import multiprocessing.util
+
+from ts_tokenizer.token_cache import TOKEN_CACHE, MISSING
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+SEED_FILE = os.path.join(DATA_DIR, 'frequent_tokens.txt')
+SCHEMA_VERSION = 1
+FLUSH_ENTRIES = 10000  # new entries a worker collects before it writes them without waiting for the end of the run
+
+_disk_cache_path = None
+
+
+def data_fingerprint():
+    """
+    Returns a hash of the package version and the contents of the data files, which the analysis of a token
+    depends on. A cache built with another fingerprint is discarded.
+    """
+    from ts_tokenizer import __version__
+
+    digest = hashlib.sha256(f"{__version__}\0{SCHEMA_VERSION}".encode('utf-8'))
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, '*.txt'))):
+        digest.update(os.path.basename(path).encode('utf-8') + b"\0")
+        with open(path, 'rb') as data_file:
+            digest.update(data_file.read())
+    return digest.hexdigest()
+
+
+def _is_storable(result):
+    if isinstance(result, tuple):
+        return bool(result) and all(isinstance(item, str) for item in result)
+    return isinstance(result, list) and all(_is_storable(item) for item in result)
+
+
+def encode_result(result):
+    """
+    Encodes a process_token result as JSON, or returns None for results that would not decode to the same
+    structure: (token, tag) tuples become arrays of strings and lists arrays of arrays.
+    """
+    if not _is_storable(result):
+        return None
+    return json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_result(text):
+    return _decode(json.loads(text))
+
+
+def _decode(value):
+    if value and all(isinstance(item, str) for item in value):
+        return tuple(value)
+    return [_decode(item) for item in value]
+
+
+class DiskCache:
+    """
+    Token analyses in an SQLite file that every worker reads at once. Analyses computed by a worker are
+    collected and written back in one transaction when the worker exits (or after FLUSH_ENTRIES of them);
+    tokens analysed by other workers meanwhile are kept as they are.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self.pending = {}
+        self._lock = threading.Lock()
+        # Worker threads share the connection, every use of it holds the lock
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+
+    def get(self, token):
+        with self._lock:
+            row = self._connection.execute("SELECT result FROM analyses WHERE token = ?", (token,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+        return decode_result(row[0])
+
+    def add(self, token, result):
+        encoded = encode_result(result)
+        if encoded is None:
+            return
+        with self._lock:
+            self.pending[token] = encoded
+            full = len(self.pending) >= FLUSH_ENTRIES
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the collected analyses to the file.
+        """
+        with self._lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+            try:
+                with self._connection:
+                    self._connection.executemany("INSERT OR IGNORE INTO analyses (token, result) VALUES (?, ?)",
+                                                 pending.items())
+            except sqlite3.Error as e:
+                logging.error(f"Could not write {len(pending)} token analyses to {self.path}: {e}")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._connection.close()
+
+
+def prepare_disk_cache(path):
+    """
+    Creates the cache file or checks that it was built from the current lexicons and package version. A
+    new or outdated cache is (re)built with the analyses of the frequent tokens listed in data/.
+    """
+    from ts_tokenizer.token_handler import TokenProcessor
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fingerprint = data_fingerprint()
+    connection = sqlite3.connect(path, timeout=60)
+    try:
+        # Readers in other workers do not block the writer, and the other way around
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS analyses (token TEXT PRIMARY KEY, result TEXT NOT NULL)")
+            row = connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is not None and row[0] == fingerprint:
+                return
+            if row is not None:
+                logging.info(f"The lexicons or the package version changed, rebuilding {path}")
+            connection.execute("DELETE FROM analyses")
+            with open(SEED_FILE, encoding='utf-8') as seed_file:
+                tokens = [line.strip() for line in seed_file if line.strip()]
+            rows = ((token, encode_result(TokenProcessor.process_token_uncached(token))) for token in tokens)
+            connection.executemany("INSERT OR REPLACE INTO analyses (token, result) VALUES (?, ?)",
+                                   (row for row in rows if row[1] is not None))
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+    finally:
+        connection.close()
+
+
+def attach_disk_cache(path):
+    """
+    Puts the cache file behind the token cache of this process and writes the new analyses back at exit.
+    """
+    store = TOKEN_CACHE.store
+    if store is not None and store.pid == os.getpid():
+        if store.path == path:
+            return
+        store.close()
+    # The store of a forked parent is left alone, its connection belongs to the parent
+    TOKEN_CACHE.store = DiskCache(path) if path else None
+    if path:
+        multiprocessing.util.Finalize(TOKEN_CACHE.store, TOKEN_CACHE.store.close, exitpriority=10)
+
+
+def set_disk_cache(path):
+    """
+    Prepares the cache file and uses it in the worker pools created afterwards; None stops using it.
+    """
+    global _disk_cache_path
+    if path:
+        path = os.path.abspath(path)
+        prepare_disk_cache(path)
+    _disk_cache_path = path
+
+
+@contextlib.contextmanager
+def use_disk_cache(path=None):
+    """
+    Uses the cache file in the worker pools created while the block runs. On exit the file is detached from
+    this process, after the analyses of its thread or serial workers are written, and the cache file used
+    before is restored. None leaves the cache file unchanged.
+    """
+    global _disk_cache_path
+    if path is None:
+        yield
+        return
+    previous = _disk_cache_path
+    store = TOKEN_CACHE.store
+    attached = store.path if store is not None and store.pid == os.getpid() else None
+    set_disk_cache(path)
+    try:
+        yield
+    finally:
+        _disk_cache_path = previous
+        # Closing the store of the block writes its analyses
+        attach_disk_cache(attached)
+
+
+def disk_cache_path():
+    return _disk_cache_path
+
+
+def flush_disk_cache():
+    """
+    Writes the analyses collected by this process, e.g. by thread or serial workers, to the cache file.
+    """
+    if TOKEN_CACHE.store is not None:
+        TOKEN_CACHE.store.flush()
+
+
+__all__ = ["DiskCache", "prepare_disk_cache", "attach_disk_cache", "set_disk_cache", "use_disk_cache",
+           "disk_cache_path", "flush_disk_cache", "data_fingerprint", "encode_result", "decode_result"]
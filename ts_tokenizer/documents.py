@@ -0,0 +1,68 @@
+import os
+import re
+import mmap
+
+from ts_tokenizer.mmap_input import DEFAULT_RANGE_SIZE
+
+# Elements that enclose a document in XML/VRT corpora, and elements a large document may be split at
+DOCUMENT_TAGS = ("doc", "text")
+PARAGRAPH_TAGS = ("p",)
+
+_STRUCTURE_TAG = r'^[ \t]*<(%s)(?=[\s/>])' % "|".join(DOCUMENT_TAGS + PARAGRAPH_TAGS)
+STRUCTURE_TAG_RE = re.compile(_STRUCTURE_TAG)
+STRUCTURE_TAG_BYTES_RE = re.compile(_STRUCTURE_TAG.encode('ascii'), re.MULTILINE)
+_DOCUMENT_TAG_BYTES = {tag.encode('ascii') for tag in DOCUMENT_TAGS}
+
+
+def document_chunks(lines, chunk_bytes=DEFAULT_RANGE_SIZE):
+    """
+    Groups lines into work units of whole documents. A unit is closed before the opening tag of the next
+    document once it holds chunk_bytes, so small documents are packed together and no document is cut.
+    A document that alone grows past chunk_bytes is split before its next paragraph tag instead.
+    """
+    chunk, size, document_start = [], 0, 0
+    for line in lines:
+        match = STRUCTURE_TAG_RE.match(line)
+        if match:
+            if match.group(1) in DOCUMENT_TAGS:
+                if size >= chunk_bytes:
+                    yield chunk
+                    chunk, size = [], 0
+                document_start = size
+            elif size - document_start >= chunk_bytes:
+                yield chunk
+                chunk, size, document_start = [], 0, 0
+        chunk.append(line)
+        size += len(line.encode('utf-8'))
+    if chunk:
+        yield chunk
+
+
+def document_ranges(filename, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Splits a file into (start, end) byte ranges with the same boundaries as document_chunks(). Every range
+    starts at a line, so workers read them with read_range() like the ranges of byte_ranges().
+    """
+    if range_size < 1:
+        raise ValueError(f"range_size must be a positive integer, got {range_size}")
+
+    with open(filename, 'rb') as in_file:
+        size = os.fstat(in_file.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start = document_start = 0
+            for match in STRUCTURE_TAG_BYTES_RE.finditer(mapped):
+                position = match.start()
+                if match.group(1) in _DOCUMENT_TAG_BYTES:
+                    if position - start >= range_size:
+                        yield start, position
+                        start = position
+                    document_start = position
+                elif position - max(start, document_start) >= range_size:
+                    yield start, position
+                    start = position
+            yield start, size
+
+
+__all__ = ["DOCUMENT_TAGS", "PARAGRAPH_TAGS", "document_chunks", "document_ranges"]
@@ -0,0 +1,56 @@
+try:
+    from json.encoder import c_encode_basestring as encode_string
+except ImportError:  # Python built without the C accelerator of the json module
+    from json.encoder import py_encode_basestring as encode_string
+
+# Serializers for the JSON output of tokenize(). They write the same text as
+# json.dumps(..., ensure_ascii=False) on the equivalent structures, without building the dicts and
+# without the generic encoder: strings are escaped by the C function that json itself uses, which only
+# escapes quotes, backslashes and control characters, and the JSON of every tag is built once.
+
+
+class _TagFragments(dict):
+    """
+    Caches the end of a {"token": ..., "tag": ...} object for every tag.
+    """
+
+    def __missing__(self, tag):
+        fragment = self[tag] = ', "tag": ' + ("null" if tag is None else encode_string(tag)) + '}'
+        return fragment
+
+
+TAG_FRAGMENTS = _TagFragments()
+
+
+def tagged_json(tokens):
+    """
+    Returns the JSON array of {"token": ..., "tag": ...} objects for a list of (token, tag) tuples.
+    """
+    fragments = TAG_FRAGMENTS
+    return '[' + ', '.join(['{"token": ' + encode_string(token[0]) + fragments[token[1]] for token in tokens]) + ']'
+
+
+def tagged_lines_json(tokens):
+    """
+    Same as tagged_json(), with a null tag for tokens that have none.
+    """
+    fragments = TAG_FRAGMENTS
+    return '[' + ', '.join(['{"token": ' + encode_string(token[0]) + fragments[token[1] if len(token) > 1 else None]
+                            for token in tokens]) + ']'
+
+
+def lines_json(tokens):
+    """
+    Returns the JSON object {"tokens": [...]} with the strings of a list of (token, tag) tuples.
+    """
+    return '{"tokens": [' + ', '.join([encode_string(token[0]) for token in tokens]) + ']}'
+
+
+def token_json(token, tag):
+    """
+    Returns the JSON object of a single token, e.g. an XML tag.
+    """
+    return '{"token": ' + encode_string(token) + TAG_FRAGMENTS[tag]
+
+
+__all__ = ["tagged_json", "tagged_lines_json", "lines_json", "token_json", "encode_string"]
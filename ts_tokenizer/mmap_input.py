@@ -0,0 +1,95 @@
+import io
+import os
+import mmap
+import logging
+import threading
+
+DEFAULT_RANGE_SIZE = 1 << 20  # 1 MiB
+MAX_MAPPED_FILES = 8
+
+# Worker-side cache of the most recently mapped input files, so every byte range does not remap the file.
+# Entries are keyed by the name, inode, size and modification time of the file, so a file that was
+# replaced or rewritten since it was mapped, e.g. between two runs on a persistent pool, is mapped again.
+# The lock serialises lookups from worker threads.
+_mapped_files = {}
+_mapped_files_lock = threading.Lock()
+
+
+def _advise(fd, offset, length, advice_name):
+    advice = getattr(os, advice_name, None)
+    if advice is not None and hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError as e:
+            logging.debug(f"posix_fadvise failed: {e}")
+
+
+def map_file(filename):
+    """
+    Returns a read-only memory map of the file, reusing the mapping on later calls in the same process
+    while the file is unchanged.
+    """
+    stat = os.stat(filename)
+    key = (filename, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _mapped_files_lock:
+        mapped = _mapped_files.get(key)
+        if mapped is None:
+            if stat.st_size == 0:
+                return b""
+            with open(filename, 'rb') as in_file:
+                stat = os.fstat(in_file.fileno())
+                key = (filename, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                if stat.st_size == 0:
+                    return b""
+                mapped = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            # Mappings of earlier versions of the file are not used again. Like evicted mappings, they are
+            # closed when the last reader releases them.
+            for stale in [cached for cached in _mapped_files if cached[0] == filename]:
+                del _mapped_files[stale]
+            if len(_mapped_files) >= MAX_MAPPED_FILES:
+                # Every mapping keeps a file descriptor open, drop the oldest one. It is closed when the
+                # last reader releases it, as another thread may still be reading from it.
+                del _mapped_files[next(iter(_mapped_files))]
+            _mapped_files[key] = mapped
+    return mapped
+
+
+def byte_ranges(filename, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Splits a file into (start, end) byte ranges of roughly range_size bytes, each ending right after a
+    newline. Ranges are produced lazily and the kernel is asked to read each one ahead of the workers.
+    """
+    if range_size < 1:
+        raise ValueError(f"range_size must be a positive integer, got {range_size}")
+
+    with open(filename, 'rb') as in_file:
+        fd = in_file.fileno()
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return
+        _advise(fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+            start = 0
+            while start < size:
+                end = mapped.find(b"\n", min(start + range_size, size) - 1)
+                end = size if end == -1 else end + 1
+                _advise(fd, start, end - start, 'POSIX_FADV_WILLNEED')
+                yield start, end
+                start = end
+
+
+def read_range(filename, start, end):
+    """
+    Decodes the lines of a byte range with the same newline handling as a file opened in text mode.
+    """
+    mapped = map_file(filename)
+    if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+        page_start = start - start % mmap.PAGESIZE
+        mapped.madvise(mmap.MADV_WILLNEED, page_start, end - page_start)
+    text = mapped[start:end].decode('utf-8')
+    return list(io.StringIO(text, newline=None))
+
+
+__all__ = ["DEFAULT_RANGE_SIZE", "byte_ranges", "read_range", "map_file"]
@@ -0,0 +1,125 @@
+import re
+import html
+from collections import namedtuple
+
+from ts_tokenizer.char_fix import (CharFix, REPLACEMENTS_CONTROL_CHAR, REPLACEMENTS_QUOTE, REPLACEMENTS_CHAR,
+                                   REPLACEMENTS_HTML)
+
+# A token with its span in the line after CharFix (start, end) and in the original line (raw_start, raw_end),
+# both as str slice indices. Spans of tokens that could not be aligned are None.
+TokenSpan = namedtuple("TokenSpan", ["token", "tag", "start", "end", "raw_start", "raw_end"])
+
+# The passes of CharFix.replace_all, in the same order
+_FIX_PASSES = [
+    (CharFix._compiled_pattern_control, dict(REPLACEMENTS_CONTROL_CHAR)),
+    (CharFix._compiled_pattern_quote, dict(REPLACEMENTS_QUOTE)),
+    (CharFix._compiled_pattern_char, dict(REPLACEMENTS_CHAR)),
+    (CharFix._compiled_pattern_html, dict(REPLACEMENTS_HTML)),
+]
+# The character reference pattern of html.unescape()
+_CHARREF_RE = re.compile(r'&(#[0-9]+;?|#[xX][0-9a-fA-F]+;?|[^\t\n\f <&#;]{1,32};?)')
+_INVISIBLE_RE = re.compile('[\u200b\ufeff]')
+WORD_RE = re.compile(r'\S+')
+
+
+def sub_with_offsets(pattern, replace, text, starts, ends):
+    """
+    Runs pattern.sub(replace, text) and maps every character of the result to a span of the string text
+    was made from: character i of text comes from [starts[i], ends[i]), and every character of a replacement
+    from the span of the whole match. Characters a replacement ends with, like the text after a broken
+    entity, keep their own offsets. Unchanged mappings are returned as they are, so ranges stay ranges.
+    """
+    pieces, new_starts, new_ends, position = [], [], [], 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        replacement = replace(match)
+        kept = 0
+        while kept < len(replacement) and kept < end - start and replacement[-1 - kept] == text[end - 1 - kept]:
+            kept += 1
+        end -= kept
+        replacement = replacement[:len(replacement) - kept]
+        pieces.append(text[position:start])
+        new_starts += starts[position:start]
+        new_ends += ends[position:start]
+        pieces.append(replacement)
+        new_starts += [starts[start]] * len(replacement)
+        new_ends += [ends[end - 1] if end > start else starts[start]] * len(replacement)
+        position = end
+    if not pieces:
+        return text, starts, ends
+    pieces.append(text[position:])
+    new_starts += starts[position:]
+    new_ends += ends[position:]
+    return "".join(pieces), new_starts, new_ends
+
+
+def fix_with_offsets(line):
+    """
+    Applies CharFix.fix() to a line and returns the fixed line with the start and end offsets in the
+    original line of each of its characters.
+    """
+    text, starts, ends = line, range(len(line)), range(1, len(line) + 1)
+    for pattern, replacements in _FIX_PASSES:
+        for _ in range(10):  # As CharFix.batch_replace
+            new_text, new_starts, new_ends = sub_with_offsets(pattern, lambda match: replacements[match.group(0)],
+                                                              text, starts, ends)
+            if new_text == text:
+                break
+            text, starts, ends = new_text, new_starts, new_ends
+    if '&' in text:
+        text, starts, ends = sub_with_offsets(_CHARREF_RE, lambda match: html.unescape(match.group(0)),
+                                              text, starts, ends)
+    return text, starts, ends
+
+
+def clean_with_offsets(line):
+    """
+    Applies clean_line() to a line and returns the cleaned line with the start and end offsets in line
+    of each of its characters.
+    """
+    text = line.lstrip()
+    start = len(line) - len(text)
+    text = text.rstrip()
+    return sub_with_offsets(_INVISIBLE_RE, lambda match: "", text, range(start, start + len(text)),
+                            range(start + 1, start + len(text) + 1))
+
+
+def map_span(start, end, starts, ends):
+    """
+    Maps a span of a transformed string to the string it was made from, with its character offsets.
+    """
+    if start is None:
+        return None, None
+    if start == end:
+        position = starts[start] if start < len(starts) else (ends[-1] if ends else 0)
+        return position, position
+    return starts[start], ends[end - 1]
+
+
+def align_tokens(tokens, text, start=0, end=None):
+    """
+    Finds the (start, end) span of every token in text[start:end], in order. A token matches as it is or,
+    since some handlers lowercase tokens, ignoring case with the Turkish rules of CharFix.tr_lowercase.
+    A token that is not found gets (None, None) and the search for the next one goes on from the same place.
+    """
+    if end is None:
+        end = len(text)
+    spans, position = [], start
+    for token in tokens:
+        token_end = position + len(token)
+        if text.startswith(token, position, end) or (
+                token_end <= end and CharFix.tr_lowercase(text[position:token_end]) == CharFix.tr_lowercase(token)):
+            spans.append((position, token_end))
+            position = token_end
+            continue
+        found = text.find(token, position, end)
+        if found < 0:
+            spans.append((None, None))
+        else:
+            position = found + len(token)
+            spans.append((found, position))
+    return spans
+
+
+__all__ = ["TokenSpan", "fix_with_offsets", "clean_with_offsets", "sub_with_offsets", "map_span", "align_tokens",
+           "WORD_RE"]
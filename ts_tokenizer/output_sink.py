@@ -0,0 +1,196 @@
+import os
+import sys
+import logging
+
+from ts_tokenizer.compressed_io import open_output, output_compression
+
+DEFAULT_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+
+class OutputSink:
+    """
+    Collects output records in memory and writes them to a binary stream in large blocks.
+    Every record is followed by a newline, just like print().
+    """
+
+    def __init__(self, stream=None, buffer_size=DEFAULT_BUFFER_SIZE, close_stream=False):
+        if stream is None:
+            # Bypass the text layer of stdout, after flushing anything already printed to it
+            sys.stdout.flush()
+            stream = getattr(sys.stdout, 'buffer', sys.stdout)
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.close_stream = close_stream
+        self._buffer = []
+        self._buffered = 0
+        self.bytes_written = 0
+        self.lines_written = 0
+
+    def write(self, record):
+        self._write_data((record + "\n").encode('utf-8'), record.count("\n") + 1)
+
+    def _write_data(self, data, lines):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self.bytes_written += len(data)
+        self.lines_written += lines
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def position(self):
+        return {"bytes": self.bytes_written, "lines": self.lines_written}
+
+    def _restore(self, position):
+        self.bytes_written = position["bytes"]
+        self.lines_written = position["lines"]
+
+    def sync(self):
+        """
+        Writes buffered records, forces them to disk and returns the output position for a checkpoint.
+        """
+        self.flush()
+        try:
+            os.fsync(self.stream.fileno())
+        except (AttributeError, OSError, ValueError):
+            pass  # Not a regular file, e.g. a pipe or a compressing writer
+        return self.position()
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        if self.close_stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def reopen_output(path, size):
+    """
+    Truncates a partly written output file to size bytes and opens it for appending, for resumed runs.
+    """
+    if output_compression(path):
+        raise ValueError(f"Cannot resume writing a compressed output file: {path}")
+    if not size:
+        return open(path, 'wb')
+    with open(path, 'r+b') as out_file:
+        out_file.truncate(size)
+    return open(path, 'ab')
+
+
+class FileSink(OutputSink):
+    """
+    Writes output records to a single file, compressed when its name ends in .gz, .bz2, .xz or .zst.
+    A resume_from position continues a file written by an interrupted run.
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE, resume_from=None):
+        self.path = path
+        stream = reopen_output(path, resume_from["bytes"]) if resume_from else open_output(path)
+        super().__init__(stream, buffer_size=buffer_size, close_stream=True)
+        if resume_from:
+            self._restore(resume_from)
+
+
+def part_path(path, index):
+    """
+    Returns the name of the index'th part file, e.g. out.txt -> out-00003.txt.
+    """
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition('.')
+    return os.path.join(directory, f"{stem}-{index:05d}{dot}{extensions}")
+
+
+class RotatingFileSink(OutputSink):
+    """
+    Writes output records into numbered part files and starts a new part once the current one
+    reaches max_bytes or max_lines. A record that does not fit into the current part is split at
+    line boundaries, so no output line is ever split across parts.
+    """
+
+    def __init__(self, path, max_bytes=None, max_lines=None, buffer_size=DEFAULT_BUFFER_SIZE, resume_from=None):
+        if not max_bytes and not max_lines:
+            raise ValueError("RotatingFileSink needs max_bytes or max_lines")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.part_index = 0
+        self._part_bytes = 0
+        self._part_lines = 0
+        if resume_from:
+            self.part_index = resume_from["part"]
+            self._part_bytes = resume_from["part_bytes"]
+            self._part_lines = resume_from["part_lines"]
+            # Parts started after the checkpoint are written again
+            stale = self.part_index + 1
+            while os.path.exists(part_path(path, stale)):
+                os.remove(part_path(path, stale))
+                stale += 1
+        self.part_paths = [part_path(path, index) for index in range(self.part_index + 1)]
+        if resume_from:
+            stream = reopen_output(self.part_paths[-1], self._part_bytes)
+        else:
+            stream = open_output(self.part_paths[0])
+        super().__init__(stream, buffer_size=buffer_size, close_stream=True)
+        if resume_from:
+            self._restore(resume_from)
+
+    def position(self):
+        return dict(super().position(), part=self.part_index, part_bytes=self._part_bytes,
+                    part_lines=self._part_lines)
+
+    def _fits(self, size, lines):
+        return ((not self.max_bytes or self._part_bytes + size <= self.max_bytes) and
+                (not self.max_lines or self._part_lines + lines <= self.max_lines))
+
+    def rotate(self):
+        self.flush()
+        self.stream.close()
+        self.part_index += 1
+        self.part_paths.append(part_path(self.path, self.part_index))
+        logging.debug(f"Rotating output to {self.part_paths[-1]}")
+        self.stream = open_output(self.part_paths[-1])
+        self._part_bytes = 0
+        self._part_lines = 0
+
+    def _write_data(self, data, lines):
+        if not self._fits(len(data), lines):
+            if lines > 1:
+                for line in data[:-1].split(b"\n"):
+                    self._write_data(line + b"\n", 1)
+                return
+            if self._part_lines:
+                self.rotate()
+        super()._write_data(data, lines)
+        self._part_bytes += len(data)
+        self._part_lines += lines
+
+
+def open_sink(output_file=None, max_bytes=None, max_lines=None, buffer_size=DEFAULT_BUFFER_SIZE, resume_from=None):
+    """
+    Returns the sink for the given target: stdout when no file is given, a rotating set of
+    part files when a size or line limit is given, and a single file otherwise. resume_from is
+    the output position recorded in a checkpoint.
+    """
+    if output_file is None:
+        if max_bytes or max_lines:
+            raise ValueError("Output rotation requires an output file")
+        if resume_from:
+            raise ValueError("Resuming requires an output file")
+        return OutputSink(buffer_size=buffer_size)
+    if max_bytes or max_lines:
+        return RotatingFileSink(output_file, max_bytes=max_bytes, max_lines=max_lines, buffer_size=buffer_size,
+                                resume_from=resume_from)
+    return FileSink(output_file, buffer_size=buffer_size, resume_from=resume_from)
+
+
+__all__ = ["OutputSink", "FileSink", "RotatingFileSink", "open_sink", "part_path", "reopen_output"]
@@ -0,0 +1,82 @@
+import sys
+import time
+import collections
+
+from tqdm import tqdm
+
+REFRESH_INTERVAL = 0.5  # seconds between updates of the rates shown next to the progress bar
+
+# Measured by a worker for every chunk it tokenizes. The worker is a (pid, thread id) pair, so that worker
+# threads of one process are told apart. cache_hits and cache_misses are the running totals of the token
+# cache of the worker's process, which its threads share
+ChunkStats = collections.namedtuple("ChunkStats", ["worker", "lines", "tokens", "bytes", "seconds", "cache_hits",
+                                                   "cache_misses"], defaults=(0, 0))
+
+
+class ProgressReport:
+    """
+    Shows a progress bar over the input bytes, with the ETA, the MB/s rate, live lines/s and tokens/s
+    rates and the utilisation of the workers, i.e. the share of the wall time they spent tokenizing.
+    The total may be None when the input size is not known in advance, e.g. for piped input.
+    """
+
+    def __init__(self, total=None, num_workers=1, desc="Processing", initial=0):
+        self.num_workers = num_workers
+        self.lines = 0
+        self.tokens = 0
+        self.busy = collections.defaultdict(float)
+        self.cache = {}
+        self.started = time.perf_counter()
+        self._refreshed = self.started
+        self.pbar = tqdm(total=total, initial=initial, desc=desc, unit='B', unit_scale=True, file=sys.stderr)
+
+    def update(self, stats):
+        self.lines += stats.lines
+        self.tokens += stats.tokens
+        self.busy[stats.worker] += stats.seconds
+        pid = stats.worker[0]
+        hits, misses = self.cache.get(pid, (0, 0))
+        self.cache[pid] = (max(hits, stats.cache_hits), max(misses, stats.cache_misses))
+        self.pbar.update(stats.bytes)
+        now = time.perf_counter()
+        if now - self._refreshed >= REFRESH_INTERVAL:
+            self._refreshed = now
+            self.pbar.set_postfix_str(self.rates(now))
+
+    def utilisation(self, now=None):
+        """
+        Returns the busy share of every worker, busiest first. Workers that got no chunk yet count as idle.
+        """
+        elapsed = max((now or time.perf_counter()) - self.started, 1e-9)
+        shares = sorted((busy / elapsed for busy in self.busy.values()), reverse=True)
+        return shares + [0.0] * (self.num_workers - len(shares))
+
+    def rates(self, now=None):
+        now = now or time.perf_counter()
+        elapsed = max(now - self.started, 1e-9)
+        shares = self.utilisation(now)
+        return (f"{self.lines / elapsed:,.0f} lines/s, {self.tokens / elapsed:,.0f} tokens/s, "
+                f"workers {sum(shares) / len(shares):.0%} busy ({shares[-1]:.0%}-{shares[0]:.0%})")
+
+    def cache_hit_rate(self):
+        """
+        Returns the share of process_token calls answered by the token caches of the workers, or None.
+        """
+        hits = sum(hits for hits, _ in self.cache.values())
+        lookups = hits + sum(misses for _, misses in self.cache.values())
+        return hits / lookups if lookups else None
+
+    def close(self):
+        now = time.perf_counter()
+        self.pbar.set_postfix_str(self.rates(now))
+        self.pbar.close()
+        elapsed = now - self.started
+        shares = ", ".join(f"{share:.0%}" for share in self.utilisation(now))
+        hit_rate = self.cache_hit_rate()
+        cache = "" if hit_rate is None else f". Token cache hits: {hit_rate:.0%}"
+        tqdm.write(f"Processed {self.lines:,} lines, {self.tokens:,} tokens and "
+                   f"{tqdm.format_sizeof(self.pbar.n, 'B')} in {elapsed:,.1f}s. Worker utilisation: {shares}{cache}",
+                   file=sys.stderr)
+
+
+__all__ = ["ProgressReport", "ChunkStats"]
@@ -2,6 +2,7 @@ import re
 import string
 from typing import Union, Optional
 from .char_fix import CharFix
+from .token_context import TokenContext
 from .data import LocalData
 from .date_check import DateCheck
 
@@ -105,7 +106,7 @@ class PuncMatcher:
     @staticmethod
     def hyphen_in(word):
         parts = word.split("-")
-        cleaned_word = CharFix.fix(word)
+        cleaned_word = TokenContext.of(word).fixed
         hyphen_count = word.count("-")
 
         if "-" not in word:
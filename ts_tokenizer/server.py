@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import stat
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import collections
+from urllib.parse import urlsplit, parse_qs
+
+from ts_tokenizer.aio import AsyncTokenizer, DEFAULT_BATCH_DELAY
+from ts_tokenizer.tokenizer import DEFAULT_CHUNK_SIZE
+from ts_tokenizer.worker_pool import BACKENDS, DEFAULT_BACKEND
+from ts_tokenizer import __version__
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_SIZE = 64 << 20  # 64 MiB
+MAX_HEADERS = 100  # header lines per request, each at most as long as the stream limit of asyncio (64 KiB)
+LATENCY_WINDOW = 10000  # number of recent requests the latency percentiles are computed from
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 414: "URI Too Long", 431: "Request Header Fields Too Large",
+           500: "Internal Server Error", 501: "Not Implemented"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def percentile(values, fraction):
+    """
+    Returns the value below which the given fraction of the sorted values lies (nearest rank).
+    """
+    if not values:
+        return None
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def is_socket(path):
+    """
+    Returns whether path is a Unix socket, False when nothing is there.
+    """
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+async def read_line(reader, status, message):
+    """
+    Reads a line of the request head, raising HTTPError with the given status for a line longer than the
+    stream limit.
+    """
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise HTTPError(status, message)
+
+
+async def read_headers(reader):
+    """
+    Reads the header lines of a request up to the empty line that ends them, by lowercase name.
+    """
+    headers = {}
+    for _ in range(MAX_HEADERS + 1):
+        header = await read_line(reader, 431, "A request header line is too long")
+        if header in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    raise HTTPError(431, f"More than {MAX_HEADERS} request headers")
+
+
+def compact_format(results):
+    """
+    Formats per-line (token, tag) tuples as tab separated lines, with an empty line after every input line.
+    """
+    return "".join("".join(f"{token}\t{tag}\n" for token, tag in tokens) + "\n" for tokens in results)
+
+
+class TokenizerServer:
+    """
+    Serves tokenization over HTTP on a localhost port or a Unix socket, from one warm worker pool that keeps
+    the lexicons loaded. The lines of concurrent requests are merged into micro-batches: a batch is sent to
+    the workers once max_batch_lines lines are waiting or the oldest line has waited batch_delay seconds.
+
+    POST /tokenize   JSON {"lines": [...]} or {"text": "..."}, or a text/plain body with one line per line.
+                     Returns {"results": [[[token, tag], ...], ...]} with one entry per input line, or
+                     token<TAB>tag lines with ?format=compact.
+    GET  /stats      Request, line and batch counters, p50/p99 latency and queue depth.
+    GET  /health     Liveness check.
+    """
+
+    def __init__(self, num_workers=None, max_batch_lines=DEFAULT_CHUNK_SIZE, batch_delay=DEFAULT_BATCH_DELAY,
+                 start_method=None, backend=DEFAULT_BACKEND):
+        self.tokenizer = AsyncTokenizer(num_workers, max_batch_lines=max_batch_lines, batch_delay=batch_delay,
+                                        start_method=start_method, backend=backend)
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.lines = 0
+        self.max_queue_depth = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    async def warm_up(self):
+        """
+        Starts every worker and loads its lexicons before the first request arrives.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.tokenizer.executor, time.sleep, 0.05)
+                               for _ in range(self.tokenizer.num_workers)))
+        await self.tokenizer.tokenize_tokens("")
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        tokenizer = self.tokenizer
+        return {
+            "version": __version__,
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "workers": tokenizer.num_workers,
+            "requests": self.requests,
+            "errors": self.errors,
+            "lines": self.lines,
+            "batches": tokenizer.batches,
+            "mean_batch_lines": round(tokenizer.batched_lines / tokenizer.batches, 1) if tokenizer.batches else 0,
+            "queue_depth": tokenizer.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+                "p99": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+            },
+        }
+
+    async def tokenize(self, body, content_type, query):
+        if content_type.startswith("application/json"):
+            try:
+                request = json.loads(body)
+            except ValueError as e:
+                raise HTTPError(400, f"Invalid JSON: {e}")
+            if not isinstance(request, dict):
+                raise HTTPError(400, 'Expected a JSON object with "lines" or "text"')
+            lines = request["lines"] if "lines" in request else str(request.get("text", "")).splitlines()
+            if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+                raise HTTPError(400, '"lines" must be a list of strings')
+        else:
+            lines = body.decode("utf-8").splitlines()
+
+        self.lines += len(lines)
+        calls = [self.tokenizer.tokenize_tokens(line) for line in lines]
+        self.max_queue_depth = max(self.max_queue_depth, self.tokenizer.queue_depth + len(lines))
+        results = await asyncio.gather(*calls)
+
+        if query.get("format", ["json"])[0] == "compact":
+            return "text/tab-separated-values; charset=utf-8", compact_format(results).encode("utf-8")
+        return "application/json", json.dumps({"results": results}, ensure_ascii=False).encode("utf-8")
+
+    async def route(self, method, target, headers, body):
+        url = urlsplit(target)
+        if url.path == "/tokenize":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            return await self.tokenize(body, headers.get("content-type", "text/plain"), parse_qs(url.query))
+        if url.path in ("/stats", "/health"):
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+            payload = self.stats() if url.path == "/stats" else {"status": "ok"}
+            return "application/json", json.dumps(payload).encode("utf-8")
+        raise HTTPError(404, f"Unknown path: {url.path}")
+
+    @staticmethod
+    def body_length(headers):
+        """
+        Returns the length of the request body. Bodies are read by Content-Length only: a chunked body is
+        answered with 411 and any other transfer coding with 501.
+        """
+        codings = [coding.strip() for coding in headers.get("transfer-encoding", "identity").lower().split(",")]
+        if "chunked" in codings:
+            raise HTTPError(411, "Chunked request bodies are not supported, send a Content-Length")
+        if codings != ["identity"]:
+            raise HTTPError(501, f"Unsupported Transfer-Encoding: {', '.join(codings)}")
+        length = int(headers.get("content-length", 0))
+        if length < 0:
+            raise ValueError(f"Negative Content-Length: {length}")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, f"Request body is larger than {MAX_BODY_SIZE} bytes")
+        return length
+
+    async def handle(self, reader, writer):
+        """
+        Serves the HTTP/1.1 requests of one connection, keeping it open between requests.
+        """
+        try:
+            while True:
+                # Until the headers are read, an error answer closes the connection
+                keep_alive = False
+                target = None
+                try:
+                    request_line = await read_line(reader, 414, "The request line is too long")
+                    if not request_line.strip():
+                        break
+                    started = time.perf_counter()
+                    headers = await read_headers(reader)
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    method, target, _ = request_line.decode("latin-1").split()
+                    length = self.body_length(headers)
+                    body = await reader.readexactly(length) if length else b""
+                    content_type, payload = await self.route(method, target, headers, body)
+                    status = 200
+                except HTTPError as e:
+                    status, content_type = e.status, "application/json"
+                    # The unread body would be taken for a request
+                    keep_alive = keep_alive and status not in (411, 413, 501)
+                    payload = json.dumps({"error": str(e)}).encode("utf-8")
+                except ValueError as e:
+                    status, content_type, keep_alive = 400, "application/json", False
+                    payload = json.dumps({"error": f"Malformed request: {e}"}).encode("utf-8")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    raise  # The client went away, there is no one to answer
+                except Exception as e:
+                    logging.error(f"Error serving request: {e}", exc_info=True)
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode("utf-8")
+
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1"))
+                writer.write(payload)
+                await writer.drain()
+
+                if target and urlsplit(target).path == "/tokenize":
+                    self.requests += 1
+                    self.errors += status != 200
+                    self.latencies.append(time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        """
+        Warms up the workers and starts listening, returning the asyncio server. With port 0 the system picks a
+        free port, which server.sockets[0].getsockname() reports.
+        """
+        # A socket left behind by an earlier server is replaced, any other file is kept
+        if socket_path and os.path.lexists(socket_path) and not is_socket(socket_path):
+            raise FileExistsError(f"{socket_path} exists and is not a socket")
+        await self.warm_up()
+        if socket_path:
+            if is_socket(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+            logging.info(f"Listening on unix:{socket_path}")
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            logging.info(f"Listening on http://{host}:{server.sockets[0].getsockname()[1]}")
+        return server
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        server = await self.start(host, port, socket_path)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not available on this platform, KeyboardInterrupt still stops the server
+
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            self.tokenizer.close()
+            if socket_path and is_socket(socket_path):
+                os.remove(socket_path)
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog="ts-tokenizer serve",
+        description="Serve TS Tokenizer over HTTP from a warm worker pool, merging concurrent requests into "
+                    "micro-batches."
+    )
+    parser.add_argument('--host', default=DEFAULT_HOST, help="Address to listen on")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument('--socket', default=None, help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument('-n', '--num-workers', type=int, default=None, help="Number of parallel workers")
+    parser.add_argument('--batch-delay', type=float, default=DEFAULT_BATCH_DELAY * 1000,
+                        help="Longest time in milliseconds a line waits for its micro-batch to fill")
+    parser.add_argument('--max-batch-lines', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Send a micro-batch to the workers as soon as it holds this many lines")
+    parser.add_argument('--start-method', choices=['fork', 'forkserver', 'spawn'], default=None,
+                        help="How worker processes are started")
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Run the workers as processes, threads, subinterpreters or serially")
+    return parser
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = TokenizerServer(args.num_workers, max_batch_lines=args.max_batch_lines,
+                             batch_delay=args.batch_delay / 1000, start_method=args.start_method,
+                             backend=args.backend)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,199 @@
+import itertools
+from array import array
+from enum import IntEnum
+
+from ts_tokenizer.token_ids import UINT32
+
+
+class Tag(IntEnum):
+    """
+    The tags of TokenProcessor as small integers. Member names are the tag strings, so Tag["Punc"] and
+    Tag.Punc.name convert between the two. Values are stable: new tags are only ever added at the end.
+    """
+    OOV = 0
+    Valid_Word = 1
+    Punc = 2
+    Number = 3
+    XML_Tag = 4
+    Abbr = 5
+    Apostrophed = 6
+    English_Word = 7
+    Exception = 8
+    Non_Latin = 9
+    Mention = 10
+    Mention_Suffix = 11
+    Hashtag = 12
+    Hashtag_Suffix = 13
+    Numbered_Title = 14
+    Date = 15
+    Date_Range = 16
+    Date_Range_Suffix = 17
+    Hour = 18
+    Hour_Suffix = 19
+    Percentage_Numbers = 20
+    Roman_Number = 21
+    Ordinal_Number = 22
+    Number_Sequence = 23
+    Bullet_List = 24
+    Email = 25
+    Full_URL = 26
+    Web_URL = 27
+    URL_Suffix = 28
+    IP_Address = 29
+    DOI = 30
+    ISBN = 31
+    Copyright = 32
+    Registered = 33
+    Trademark = 34
+    Currency = 35
+    Celsius = 36
+    Fahrenheit = 37
+    Kelvin = 38
+    Formula = 39
+    Math_Operator = 40
+    Smiley = 41
+    Emoticon = 42
+    Multiple_Emoticon = 43
+    Single_Hyphenated = 44
+    Multi_Hyphenated = 45
+    Single_Underscored = 46
+    Multi_Underscored = 47
+    One_Char_Fixed = 48
+    Complex_Punc = 49
+    Three_Or_More = 50
+
+
+TAG_IDS = {tag.name: tag.value for tag in Tag}
+TAG_NAMES = [tag.name for tag in Tag]
+
+
+class TokenView:
+    """
+    A token of a TokenBatch, read from the batch on access. Unpacks like the (token, tag) tuple it stands for.
+    """
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def token(self):
+        offsets = self.batch.offsets
+        return self.batch.text[offsets[self.index]:offsets[self.index + 1]]
+
+    @property
+    def tag(self):
+        return Tag(self.batch.tags[self.index])
+
+    def __iter__(self):
+        return iter((self.token, TAG_NAMES[self.batch.tags[self.index]]))
+
+    def __repr__(self):
+        return f"TokenView({self.token!r}, {self.tag.name})"
+
+
+class LineView:
+    """
+    The tokens of one input line of a TokenBatch.
+    """
+    __slots__ = ("batch", "start", "end")
+
+    def __init__(self, batch, start, end):
+        self.batch = batch
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        return TokenView(self.batch, self.start + index)
+
+    def __iter__(self):
+        batch = self.batch
+        return (TokenView(batch, index) for index in range(self.start, self.end))
+
+    def tolist(self):
+        return [tuple(token) for token in self]
+
+
+class TokenBatch:
+    """
+    The tokens of a chunk of lines in a few flat buffers instead of one (token, tag) tuple per token: the
+    token strings concatenated into text with their boundaries in offsets (token i is
+    text[offsets[i]:offsets[i + 1]]), Tag values in tags, and the boundaries of every input line in
+    line_offsets, as token indexes. A batch pickles as one string and three arrays, so it is cheap to send
+    between workers and the parent. Indexing a batch gives a LineView, tolist() the tuples of every line.
+    """
+    __slots__ = ("text", "offsets", "tags", "line_offsets")
+
+    def __init__(self, text="", offsets=None, tags=None, line_offsets=None):
+        self.text = text
+        self.offsets = array(UINT32, [0]) if offsets is None else offsets
+        self.tags = array('B') if tags is None else tags
+        self.line_offsets = array(UINT32, [0]) if line_offsets is None else line_offsets
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        Builds a batch from lists of (token, tag) tuples, one per line.
+        """
+        tokens, tags, line_offsets = [], array('B'), array(UINT32, [0])
+        for line in lines:
+            for token, tag in line:
+                tokens.append(token)
+                try:
+                    tags.append(TAG_IDS[tag])
+                except KeyError:
+                    raise ValueError(f"Unknown tag: {tag!r}") from None
+            line_offsets.append(len(tokens))
+        offsets = array(UINT32, [0])
+        offsets.extend(itertools.accumulate(map(len, tokens)))
+        return cls("".join(tokens), offsets, tags, line_offsets)
+
+    def __len__(self):
+        return len(self.line_offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        return LineView(self, self.line_offsets[index], self.line_offsets[index + 1])
+
+    def __iter__(self):
+        line_offsets = self.line_offsets
+        return (LineView(self, start, end) for start, end in zip(line_offsets, line_offsets[1:]))
+
+    @property
+    def token_count(self):
+        return len(self.tags)
+
+    def tokens(self):
+        """
+        Returns the token strings of the whole batch.
+        """
+        text, offsets = self.text, self.offsets
+        return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def tolist(self):
+        """
+        Returns one list of (token, tag) tuples per line, as iter_tokenize() yields them.
+        """
+        pairs = list(zip(self.tokens(), map(TAG_NAMES.__getitem__, self.tags)))
+        line_offsets = self.line_offsets
+        return [pairs[start:end] for start, end in zip(line_offsets, line_offsets[1:])]
+
+    def __getstate__(self):
+        return self.text, self.offsets, self.tags, self.line_offsets
+
+    def __setstate__(self, state):
+        self.text, self.offsets, self.tags, self.line_offsets = state
+
+
+__all__ = ["Tag", "TokenBatch", "LineView", "TokenView", "TAG_IDS", "TAG_NAMES"]
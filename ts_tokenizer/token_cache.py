@@ -0,0 +1,125 @@
+import threading
+import contextlib
+import collections
+
+DEFAULT_CACHE_SIZE = 1 << 16  # tokens, a few tens of MiB per worker
+
+CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+MISSING = object()
+
+
+def copy_result(result):
+    """
+    Copies the lists of a process_token result, nested ones included. Tuples are immutable and shared.
+    """
+    if isinstance(result, list):
+        return [copy_result(item) if isinstance(item, list) else item for item in result]
+    return result
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of TokenProcessor.process_token results by token. Token frequencies are Zipfian, so
+    a small cache answers most lookups. Results are copied on the way in and out, so that callers that
+    extend a returned list do not change the cache, and every access holds a lock, so that worker threads
+    can share one cache. A maxsize of 0 disables the cache. Tokens that are not cached are looked up in the
+    store, a DiskCache, when there is one, and new results are added to it.
+    """
+    store = None
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        if maxsize < 0:
+            raise ValueError(f"maxsize must not be negative, got {maxsize}")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        """
+        Returns a copy of the cached result of a token, or MISSING.
+        """
+        with self._lock:
+            result = self._entries.get(token, MISSING)
+            if result is not MISSING:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return copy_result(result)
+            self.misses += 1
+        if self.store is not None:
+            result = self.store.get(token)
+            if result is not MISSING:
+                self._insert(token, copy_result(result))
+        return result
+
+    def put(self, token, result):
+        if self.store is not None:
+            self.store.add(token, result)
+        self._insert(token, copy_result(result))
+
+    def _insert(self, token, result):
+        with self._lock:
+            self._entries[token] = result
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        """
+        Changes the number of cached tokens, dropping the least recently used ones if needed.
+        """
+        if maxsize < 0:
+            raise ValueError(f"maxsize must not be negative, got {maxsize}")
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+# The cache of this process, shared by its worker threads
+TOKEN_CACHE = TokenCache()
+
+
+def set_cache_size(maxsize):
+    """
+    Sets the size of the token cache of this process. Worker pools created afterwards use the same size.
+    """
+    TOKEN_CACHE.resize(maxsize)
+
+
+@contextlib.contextmanager
+def use_cache_size(maxsize=None):
+    """
+    Sets the size of the token cache of this process while the block runs and restores the previous size on
+    exit. None leaves the size unchanged.
+    """
+    if maxsize is None:
+        yield
+        return
+    previous = TOKEN_CACHE.maxsize
+    set_cache_size(maxsize)
+    try:
+        yield
+    finally:
+        set_cache_size(previous)
+
+
+def cache_info():
+    """
+    Returns the hits, misses, maximum and current size of the token cache of this process.
+    """
+    return TOKEN_CACHE.info()
+
+
+__all__ = ["TokenCache", "TOKEN_CACHE", "CacheInfo", "set_cache_size", "use_cache_size", "cache_info",
+           "DEFAULT_CACHE_SIZE"]
@@ -0,0 +1,47 @@
+import unicodedata
+from functools import cached_property
+
+from ts_tokenizer.char_fix import CharFix
+
+
+class TokenContext(str):
+    """
+    A token with the forms the checkers look at, each computed on first use and then kept: fixed
+    (CharFix.fix, itself a TokenContext), lower (CharFix.tr_lowercase), nfc, and signature, which
+    token_handler.token_signature sets. TokenProcessor hands the context of a token to every checker in place
+    of the string, so a token is normalized once however many checkers ask. Being a str, a context works
+    wherever its token does; slices and other strings made from it are plain strs.
+    """
+    signature = None
+
+    @classmethod
+    def of(cls, word):
+        return word if isinstance(word, cls) else cls(word)
+
+    @cached_property
+    def fixed(self):
+        fixed = CharFix.fix(self)
+        # fix() of a string it leaves unchanged is that string again
+        return self if fixed == self else TokenContext(fixed)
+
+    @cached_property
+    def lower(self):
+        return CharFix.tr_lowercase(self)
+
+    @cached_property
+    def nfc(self):
+        return unicodedata.normalize('NFC', str(self))
+
+
+def plain_result(result):
+    """
+    Returns a checker result with the TokenContexts in it turned back into plain strs.
+    """
+    if isinstance(result, list):
+        return [plain_result(item) for item in result]
+    if isinstance(result, tuple):
+        return tuple(str(item) if isinstance(item, TokenContext) else item for item in result)
+    return result
+
+
+__all__ = ["TokenContext", "plain_result"]
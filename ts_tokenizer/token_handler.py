@@ -1,10 +1,12 @@
 import re
 import string
-import unicodedata
 import ipaddress
 
 from .data import LocalData
 from .char_fix import CharFix
+from .offsets import align_tokens
+from .token_cache import TOKEN_CACHE, MISSING
+from .token_context import TokenContext, plain_result
 from .date_check import DateCheck
 from .smiley_check import SmileyParser
 from .emoticon_check import EmoticonParser
@@ -80,7 +82,7 @@ ISBN_HYPHENATED_RE = re.compile(r"^(?:\d-){8}[\dXx]$|^(?:\d{3}-)(?:\d+-){3}[\dXx
 
 def check_regex(word, pattern):
     # print(f"Checking {pattern} for word: {word}")
-    return word if REGEX_PATTERNS[pattern].search(CharFix.fix(word)) else None
+    return word if REGEX_PATTERNS[pattern].search(TokenContext.of(word).fixed) else None
 
 
 def punc_count(word: str) -> int:
@@ -95,18 +97,86 @@ def punc_pos(word: str) -> list:
     return [i for i, char in enumerate(word) if char in puncs]
 
 
+# Bits of a token signature, see token_signature()
+DIGIT = 1 << 0
+PUNC = 1 << 1  # a character of puncs
+NON_WORD = 1 << 2  # a character matched by \W
+AT = 1 << 3
+HASH = 1 << 4
+APOSTROPHE = 1 << 5
+QUOTE = 1 << 6
+HYPHEN = 1 << 7
+UNDERSCORE = 1 << 8
+DOT = 1 << 9
+COLON = 1 << 10
+PERCENT = 1 << 11
+BACKSLASH = 1 << 12
+BRACKET = 1 << 13  # an opening bracket
+FORMULA = 1 << 14  # a comparison operator or ±
+MARK = 1 << 15  # ©, ® or ™
+BULLET = 1 << 16
+EMOTICON = 1 << 17  # a character of the emoticon list
+SMILEY = 1 << 18  # a non-alphanumeric character of the smiley list
+
+SIGNATURE_CHARS = {"@": AT, "#": HASH, "'": APOSTROPHE, '"': QUOTE, "-": HYPHEN, "_": UNDERSCORE, ".": DOT,
+                   ":": COLON, "%": PERCENT, "\\": BACKSLASH, "(": BRACKET, "[": BRACKET, "{": BRACKET,
+                   "<": BRACKET | FORMULA, "=": FORMULA, ">": FORMULA, "≤": FORMULA, "≥": FORMULA, "±": FORMULA,
+                   "©": MARK, "®": MARK, "™": MARK, "•": BULLET}
+_smiley_chars = None
+
+
+def char_signature(char: str) -> int:
+    global _smiley_chars
+    if _smiley_chars is None:
+        _smiley_chars = {c for smiley in LocalData.smileys() for c in smiley if not c.isalnum()}
+    signature = SIGNATURE_CHARS.get(char, 0)
+    if char.isdigit():
+        signature |= DIGIT
+    if char in puncs:
+        signature |= PUNC
+    if not (char.isalnum() or char == "_"):
+        signature |= NON_WORD
+    if char in LocalData.emoticons():
+        signature |= EMOTICON
+    if char in _smiley_chars:
+        signature |= SMILEY
+    return signature
+
+
+_char_signatures = {}
+
+
+def token_signature(token: str) -> int:
+    """
+    Returns the character classes of a token and of its CharFix form, which most checkers see, as bits.
+    A checker that needs a class the signature lacks cannot match the token. The signature of a
+    TokenContext is kept in it.
+    """
+    context = TokenContext.of(token)
+    if context.signature is None:
+        signature = 0
+        for char in set(context).union(context.fixed):
+            bits = _char_signatures.get(char)
+            if bits is None:
+                bits = _char_signatures[char] = char_signature(char)
+            signature |= bits
+        context.signature = signature
+    return context.signature
+
+
 def apply_charfix(func):
     def wrapper(word, *args, **kwargs):
-        fixed_word = CharFix.fix(word)
-        return func(fixed_word, *args, **kwargs)
+        if isinstance(word, TokenContext):
+            return func(word.fixed, *args, **kwargs)
+        # A direct call with a string gets plain strings back
+        return plain_result(func(TokenContext(word).fixed, *args, **kwargs))
 
     return wrapper
 
 
 def tr_lowercase(func):
     def wrapper(word, *args, **kwargs):
-        turkish_lowercase = CharFix.tr_lowercase(word)
-        return func(word, turkish_lowercase, *args, **kwargs)
+        return func(word, TokenContext.of(word).lower, *args, **kwargs)
 
     return wrapper
 
@@ -796,7 +866,7 @@ class TokenPreProcess:
 
     @staticmethod
     def is_emoticon(word: str):
-        word = unicodedata.normalize('NFC', word)
+        word = TokenContext.of(word).nfc
         word = word.replace(" ", "")
         if word in LocalData.emoticons():
             return [(word, "Emoticon")]
@@ -1341,7 +1411,7 @@ class TokenPreProcess:
         # Think a solution for "-"
         for extra in extra_chars:
             if PuncMatcher.punc_pos(extra) != [0] or PuncMatcher.punc_pos(word) != [-1]:
-                fixed_word = word.replace(extra, "")
+                fixed_word = word.replace(extra, "") if extra in word else word
                 if TokenPreProcess.is_in_lexicon(fixed_word):
                     return [(fixed_word, "One_Char_Fixed")]
         return None
@@ -1558,6 +1628,80 @@ multi_punc = [
     TokenPreProcess.is_math,
 ]
 
+# What a checker needs to match: masks that must each share a bit with the token signature. Every entry is a
+# necessary condition of the checker (is_number also tags a lone "." but is_single_punc always comes first).
+# Checkers that are not listed run for every token.
+CHECK_REQUIRES = {
+    TokenPreProcess.is_single_punc: (PUNC,),
+    TokenPreProcess.is_ip_address: (DIGIT | COLON,),
+    TokenPreProcess.is_doi: (DIGIT,),
+    TokenPreProcess.is_isbn: (DIGIT, HYPHEN),
+    TokenPreProcess.is_formula: (FORMULA,),
+    TokenPreProcess.is_mention_suffix: (AT, APOSTROPHE),
+    TokenPreProcess.is_hashtag_suffix: (HASH, APOSTROPHE),
+    TokenPreProcess.is_numeric_hyphenated_with_apostrophe_suffix: (DIGIT, HYPHEN, APOSTROPHE),
+    TokenPreProcess.is_full_url: (DOT, COLON),
+    TokenPreProcess.is_web_url: (DOT,),
+    TokenPreProcess.is_email: (AT, DOT),
+    TokenPreProcess.is_currency: (DIGIT,),
+    TokenPreProcess.is_date_range_suffix: (DIGIT, APOSTROPHE),
+    TokenPreProcess.is_date_range: (DIGIT,),
+    TokenPreProcess.is_date: (DIGIT,),
+    TokenPreProcess.is_hour: (DIGIT,),
+    TokenPreProcess.is_hour_suffix: (DIGIT, APOSTROPHE),
+    TokenPreProcess.is_currency_suffix: (DIGIT, APOSTROPHE),
+    TokenPreProcess.is_hyphenated_with_apostrophe_suffix: (HYPHEN, APOSTROPHE),
+    TokenPreProcess.is_number_suffix: (DIGIT, APOSTROPHE),
+    TokenPreProcess.is_number: (DIGIT,),
+    TokenPreProcess.is_mention: (AT,),
+    TokenPreProcess.is_multiple_hashtag: (HASH,),
+    TokenPreProcess.is_hashtag: (HASH,),
+    TokenPreProcess.is_in_quotes: (APOSTROPHE | QUOTE,),
+    TokenPreProcess.is_escaped_opening_quote: (BACKSLASH,),
+    TokenPreProcess.is_opening_quote: (APOSTROPHE | QUOTE,),
+    TokenPreProcess.is_abbr_with_apostrophe_suffix: (DOT, APOSTROPHE),
+    TokenPreProcess.is_apostrophed: (APOSTROPHE,),
+    TokenPreProcess.is_numbered_title: (BRACKET,),
+    TokenPreProcess.is_parenthesized_with_trailing_colon: (BRACKET, COLON),
+    TokenPreProcess.is_markdown_link: (BRACKET,),
+    TokenPreProcess.is_markdown_link_tail: (BRACKET,),
+    TokenPreProcess.is_in_parenthesis: (BRACKET,),
+    TokenPreProcess.is_registered: (MARK,),
+    TokenPreProcess.is_copyright: (MARK,),
+    TokenPreProcess.is_trademark: (MARK,),
+    TokenPreProcess.is_marked_with_trailing_punc: (MARK,),
+    TokenPreProcess.is_bullet_list: (BULLET,),
+    TokenPreProcess.is_percentage_numbers_chars: (PERCENT,),
+    TokenPreProcess.is_percentage_numbers: (PERCENT,),
+    TokenPreProcess.is_emoticon_in: (EMOTICON,),
+    TokenPreProcess.is_smiley_in: (SMILEY,),
+    TokenPreProcess.is_multiple_smiley: (SMILEY,),
+    TokenPreProcess.is_single_hyphenated: (HYPHEN,),
+    TokenPreProcess.is_multi_hyphenated: (HYPHEN,),
+    TokenPreProcess.is_single_underscored: (UNDERSCORE,),
+    TokenPreProcess.is_multi_underscored: (UNDERSCORE,),
+    TokenPreProcess.is_midsp: (PUNC,),
+    TokenPreProcess.is_midmp: (PUNC,),
+    TokenPreProcess.is_fsp: (PUNC,),
+    TokenPreProcess.is_fmp: (NON_WORD,),
+    TokenPreProcess.is_imp: (PUNC,),
+    TokenPreProcess.is_mssp: (PUNC,),
+    TokenPreProcess.is_multi_punc: (NON_WORD,),
+    TokenPreProcess.is_msp: (PUNC,),
+    TokenPreProcess.is_three_or_more: (PUNC,),
+    TokenPreProcess.is_complex_punc: (PUNC,),
+}
+
+
+def applicable_checks(checks: list, signature: int):
+    """
+    Yields the checkers of a list, in order, that can match a token with the given signature.
+    """
+    for check in checks:
+        requires = CHECK_REQUIRES.get(check)
+        if requires is None or all(signature & mask for mask in requires):
+            yield check
+
 
 class TokenProcessor:
 
@@ -1575,54 +1719,74 @@ class TokenProcessor:
     @staticmethod
     def process_token(token: str, output_format: str = 'tuple') -> list:
         """
-        Main method to process a token using (i) lexicon-based, (ii) regex-based,
+        Main method to process a token, see process_token_uncached. Results are kept in the token cache of
+        the process, which recursive calls for the parts of a token go through as well.
+        """
+        if TOKEN_CACHE.maxsize == 0 or output_format != 'tuple':
+            return TokenProcessor.process_token_uncached(token, output_format)
+        result = TOKEN_CACHE.get(token)
+        if result is MISSING:
+            result = TokenProcessor.process_token_uncached(token, output_format)
+            TOKEN_CACHE.put(token, result)
+        return result
+
+    @staticmethod
+    def process_token_uncached(token: str, output_format: str = 'tuple') -> list:
+        """
+        Processes a token using (i) lexicon-based, (ii) regex-based,
         (iii) multi-punctuation, and (iv) single-punctuation checks in order.
         Note that the order is important!
         """
 
+        # The checkers share the normal forms and the signature of the token
+        context = TokenContext.of(token)
+
         # Step 1: Lexicon-based checks
-        result = TokenProcessor.process_lexicon_based(token, output_format)
+        result = TokenProcessor.process_lexicon_based(context, output_format)
         if not TokenProcessor.is_oov(result):
-            return result
+            return plain_result(result)
 
         # Step 2: Regex-based checks
-        result = TokenProcessor.process_regex(token, output_format)
+        result = TokenProcessor.process_regex(context, output_format)
         if not TokenProcessor.is_oov(result):
-            return result
+            return plain_result(result)
 
         # Step 3: Multi punctuation checks
-        result = TokenProcessor.process_multi_punc(token, output_format)
+        result = TokenProcessor.process_multi_punc(context, output_format)
         if not TokenProcessor.is_oov(result):
-            return result
+            return plain_result(result)
 
         # Step 4: Single punctuation checks
-        result = TokenProcessor.process_single_punc(token, output_format)
+        result = TokenProcessor.process_single_punc(context, output_format)
         if not TokenProcessor.is_oov(result):
-            return result
+            return plain_result(result)
 
         # Step 5: Default case - return OOV if no checks matched
         return [(token, "OOV")]
 
     @staticmethod
     def process_lexicon_based(token: str, output_format: str = 'tuple') -> list:
-        for CHECK in lexicon_based:
-            result = CHECK(token)
+        context = TokenContext.of(token)
+        for CHECK in applicable_checks(lexicon_based, token_signature(context)):
+            result = CHECK(context)
             if result:
-                return result
+                return result if context is token else plain_result(result)
 
     @staticmethod
     def process_regex(token: str, output_format: str = 'tuple') -> list:
-        for CHECK in regex:
-            result = CHECK(token)
+        context = TokenContext.of(token)
+        for CHECK in applicable_checks(regex, token_signature(context)):
+            result = CHECK(context)
             if result:
-                return result
+                return result if context is token else plain_result(result)
 
     @staticmethod
     def process_single_punc(token: str, output_format: str = 'tuple') -> list:
-        for CHECK in single_punc:
-            result = CHECK(token)
+        context = TokenContext.of(token)
+        for CHECK in applicable_checks(single_punc, token_signature(context)):
+            result = CHECK(context)
             if result:
-                return result
+                return result if context is token else plain_result(result)
 
    # @staticmethod
     # def process_multi_punc(token: str, output_format: str = 'tuple') -> list:
@@ -1638,10 +1802,11 @@ class TokenProcessor:
             return [(token, "Punc")]
 
         # Handle exceptions or already processed tokens
-        for CHECK in multi_punc:
-            result = CHECK(token)
+        context = TokenContext.of(token)
+        for CHECK in applicable_checks(multi_punc, token_signature(context)):
+            result = CHECK(context)
             if result:
-                return result
+                return result if context is token else plain_result(result)
 
         return [(token, "OOV")]  # Default fallback
 
@@ -1651,3 +1816,18 @@ class TokenProcessor:
         Helper method to check if the result is Out-Of-Vocabulary (OOV).
         """
         return not result or all(tag == "OOV" for _, tag in result)
+
+    @staticmethod
+    def process_token_spans(token: str, start: int = 0) -> list:
+        """
+        Processes a token like process_token and returns (token, tag, start, end) tuples, where start and end
+        locate every resulting token, splits included, in the input token shifted by start. Tokens that
+        cannot be located get None for both.
+        """
+        result = TokenProcessor.process_token(token)
+        if isinstance(result, tuple):
+            result = [result]
+        result = [subtoken for subtoken in result if isinstance(subtoken, tuple) and len(subtoken) >= 2]
+        spans = align_tokens([subtoken[0] for subtoken in result], token)
+        return [(subtoken[0], subtoken[1], None if begin is None else begin + start,
+                 None if end is None else end + start) for subtoken, (begin, end) in zip(result, spans)]
@@ -0,0 +1,179 @@
+import os
+import sys
+import zlib
+import struct
+import logging
+import itertools
+from array import array
+
+DEFAULT_SHARD_TOKENS = 1 << 24  # tokens per shard, about 64 MiB of token IDs
+DEFAULT_HASH_BITS = 20
+
+# Array type codes of the .npy dtypes, picked by item size since it differs between platforms
+UINT32 = next(code for code in 'IL' if array(code).itemsize == 4)
+UINT16 = 'H'
+INT64 = 'q'
+NPY_KINDS = {UINT32: 'u', UINT16: 'u', INT64: 'i'}
+
+
+def write_npy(path, values):
+    """
+    Writes a one-dimensional array.array as a .npy file (format version 1.0), so that numpy.load() and
+    numpy.memmap can read it without numpy being needed here.
+    """
+    byteorder = '<' if sys.byteorder == 'little' else '>'
+    descr = f"{byteorder}{NPY_KINDS[values.typecode]}{values.itemsize}"
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({len(values)},), }}"
+    # The header is padded with spaces and ends with a newline, so that the data is 64-byte aligned
+    header += " " * (-(len(header) + 11) % 64) + "\n"
+    with open(path, 'wb') as out_file:
+        out_file.write(b"\x93NUMPY\x01\x00" + struct.pack('<H', len(header)) + header.encode('latin-1'))
+        values.tofile(out_file)
+
+
+class ChunkIds:
+    """
+    Collects the (token, tag) tuples of a chunk inside a worker, with IDs that are local to the chunk.
+    Only the distinct tokens and tags of the chunk are sent back as strings, with their counts.
+    """
+
+    def __init__(self):
+        self.tokens = {}
+        self.tags = {}
+        self.counts = array(UINT32)
+        self.tag_counts = array(UINT32)
+        self.token_ids = array(UINT32)
+        self.tag_ids = array(UINT16)
+        self.lengths = array(UINT32)
+
+    def add_line(self, line_tokens):
+        tokens, tags, counts, tag_counts = self.tokens, self.tags, self.counts, self.tag_counts
+        for token, tag in line_tokens:
+            token_id = tokens.get(token)
+            if token_id is None:
+                token_id = tokens[token] = len(tokens)
+                counts.append(0)
+            counts[token_id] += 1
+            self.token_ids.append(token_id)
+            tag_id = tags.get(tag)
+            if tag_id is None:
+                tag_id = tags[tag] = len(tags)
+                tag_counts.append(0)
+            tag_counts[tag_id] += 1
+            self.tag_ids.append(tag_id)
+        self.lengths.append(len(line_tokens))
+
+    def result(self):
+        if not self.lengths:
+            return None
+        return (list(self.tokens), self.counts, self.token_ids, list(self.tags), self.tag_counts, self.tag_ids,
+                self.lengths)
+
+
+class Vocabulary:
+    """
+    Assigns IDs to strings in order of first appearance and counts their occurrences. With hash_bits,
+    IDs are the CRC-32 of the UTF-8 string reduced to hash_bits bits instead: stable across runs and
+    machines without a shared vocabulary, at the price of collisions.
+    """
+
+    def __init__(self, hash_bits=None):
+        if hash_bits is not None and not 1 <= hash_bits <= 32:
+            raise ValueError(f"hash_bits must be between 1 and 32, got {hash_bits}")
+        self.mask = (1 << hash_bits) - 1 if hash_bits else None
+        self.ids = {}
+        self.counts = {}
+
+    def get(self, string, count=0):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            if self.mask is None:
+                string_id = len(self.ids)
+            else:
+                string_id = zlib.crc32(string.encode('utf-8')) & self.mask
+            self.ids[string] = string_id
+            self.counts[string] = 0
+        self.counts[string] += count
+        return string_id
+
+    def save(self, path):
+        """
+        Writes the vocabulary as id<TAB>string<TAB>count lines, sorted by ID.
+        """
+        with open(path, 'w', encoding='utf-8') as out_file:
+            for string, string_id in sorted(self.ids.items(), key=lambda item: item[1]):
+                out_file.write(f"{string_id}\t{string}\t{self.counts[string]}\n")
+
+
+class TokenIdWriter:
+    """
+    Writes the ChunkIds results of the workers as .npy shards of token IDs (uint32), tag IDs (uint16) and
+    line offsets (int64, one more than the number of lines: the tokens of line i are
+    tokens[offsets[i]:offsets[i + 1]]). The chunk-local IDs are mapped to the vocabulary here, and
+    <prefix>.vocab.tsv and <prefix>.tags.tsv are written on close. A shard is closed at the first line
+    boundary after shard_tokens tokens.
+    """
+
+    def __init__(self, prefix, hash_bits=None, shard_tokens=DEFAULT_SHARD_TOKENS):
+        if shard_tokens < 1:
+            raise ValueError(f"shard_tokens must be a positive integer, got {shard_tokens}")
+        self.prefix = prefix
+        self.shard_tokens = shard_tokens
+        self.vocabulary = Vocabulary(hash_bits)
+        self.tags = Vocabulary()
+        self.shards = 0
+        self.lines_written = 0
+        self.tokens_written = 0
+        self._new_shard()
+
+    def _new_shard(self):
+        self.token_ids = array(UINT32)
+        self.tag_ids = array(UINT16)
+        self.offsets = array(INT64, [0])
+
+    def write(self, result):
+        tokens, counts, token_ids, tags, tag_counts, tag_ids, lengths = result
+        token_map = [self.vocabulary.get(token, count) for token, count in zip(tokens, counts)]
+        tag_map = [self.tags.get(tag, count) for tag, count in zip(tags, tag_counts)]
+        self.token_ids.extend(map(token_map.__getitem__, token_ids))
+        self.tag_ids.extend(map(tag_map.__getitem__, tag_ids))
+        offsets = itertools.accumulate(lengths, initial=self.offsets[-1])
+        next(offsets)  # The initial value is the last offset already
+        self.offsets.extend(offsets)
+        if len(self.token_ids) >= self.shard_tokens:
+            self.flush()
+
+    def shard_path(self, shard, name):
+        return f"{self.prefix}-{shard:05d}.{name}.npy"
+
+    def flush(self):
+        """
+        Writes the lines collected so far as the next shard.
+        """
+        if len(self.offsets) == 1:
+            return
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        write_npy(self.shard_path(self.shards, "tokens"), self.token_ids)
+        write_npy(self.shard_path(self.shards, "tags"), self.tag_ids)
+        write_npy(self.shard_path(self.shards, "offsets"), self.offsets)
+        self.shards += 1
+        self.lines_written += len(self.offsets) - 1
+        self.tokens_written += len(self.token_ids)
+        self._new_shard()
+
+    def close(self):
+        self.flush()
+        self.vocabulary.save(f"{self.prefix}.vocab.tsv")
+        self.tags.save(f"{self.prefix}.tags.tsv")
+        logging.info(f"Wrote {self.tokens_written} token IDs of {self.lines_written} lines in {self.shards} shards")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+__all__ = ["TokenIdWriter", "ChunkIds", "Vocabulary", "write_npy", "DEFAULT_SHARD_TOKENS", "DEFAULT_HASH_BITS"]
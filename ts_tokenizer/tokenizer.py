@@ -1,46 +1,166 @@
+import io
+import os
 import re
 import sys
+import time
+import contextlib
 import multiprocessing
-import json
-import tqdm
+import collections
 import logging
-from concurrent.futures import ProcessPoolExecutor
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED
 from ts_tokenizer.token_handler import TokenProcessor
 from ts_tokenizer.char_fix import CharFix
+from ts_tokenizer.output_sink import open_sink
+from ts_tokenizer.mmap_input import byte_ranges, read_range, DEFAULT_RANGE_SIZE
+from ts_tokenizer.compressed_io import open_input, is_compressed, output_compression
+from ts_tokenizer.corpus import expand_inputs, check_relpaths, corpus_units, MirroredOutput, DEFAULT_BATCH_BYTES
+from ts_tokenizer.documents import document_chunks, document_ranges
+from ts_tokenizer.corpus_formats import STRUCTURED_FORMATS
+from ts_tokenizer.token_ids import TokenIdWriter, ChunkIds, DEFAULT_SHARD_TOKENS
+from ts_tokenizer.token_batch import TokenBatch
+from ts_tokenizer.jsonl import tagged_json, tagged_lines_json, lines_json, token_json
+from ts_tokenizer.offsets import TokenSpan, WORD_RE, fix_with_offsets, clean_with_offsets, align_tokens, map_span
+from ts_tokenizer.checkpoint import Checkpoint, default_checkpoint_path, DEFAULT_CHECKPOINT_INTERVAL
+from ts_tokenizer.progress import ProgressReport, ChunkStats
+from ts_tokenizer.worker_pool import create_executor, use_executor, DEFAULT_BACKEND
+from ts_tokenizer.token_cache import TOKEN_CACHE, use_cache_size
+from ts_tokenizer.disk_cache import use_disk_cache, flush_disk_cache
 
 
-def tokenize(line, return_format, output=False):
+XML_OPEN_TAG_RE = re.compile(r'^<\s*/?\s*(\w+)(?:\s+\w+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*/?>$')
+XML_CLOSE_TAG_RE = re.compile(r'^</\s*(\w+)\s*>$')
+
+class _Counts(threading.local):
+    lines = 0
+    tokens = 0
+
+
+# Lines and tokens processed by this thread, read by measure_chunk for progress reports
+COUNTS = _Counts()
+
+
+def clean_line(line):
+    """
+    Strips whitespace and removes invisible characters from a line.
+    """
+    return line.strip().replace('\u200b', '').replace('\ufeff', '')
+
+
+def is_xml_tag(line):
     """
-    Tokenizes a single line and returns the result based on the specified return format.
+    Checks whether a cleaned line consists of a single XML open or close tag.
+    """
+    return bool(XML_OPEN_TAG_RE.match(line) or XML_CLOSE_TAG_RE.match(line))
+
+
+def process_tokens(tokens):
+    """
+    Runs whitespace separated tokens through TokenProcessor and returns a flat list of (token, tag) tuples.
     """
     processed_tokens = []
+    for token in tokens:
+        try:
+            processed_token = TokenProcessor.process_token(token)
+            if isinstance(processed_token, tuple) and len(processed_token) >= 2:
+                processed_tokens.append(processed_token)
+            elif isinstance(processed_token, list):
+                for subtoken in processed_token:
+                    if isinstance(subtoken, tuple) and len(subtoken) >= 2:
+                        processed_tokens.append(subtoken)
+                    #else:
+                    #    logging.error(f"Malformed subtoken detected: {subtoken}")
+            #else:
+                #logging.error(f"Malformed token detected: {processed_token}")
+        except Exception as e:
+            logging.error(f"Error processing token '{token}': {e}", exc_info=True)
+    COUNTS.tokens += len(processed_tokens)
+    return processed_tokens
+
+
+def tokenize_tokens(line):
+    """
+    Tokenizes a single line and returns the (token, tag) tuples without any string formatting.
+    A line that consists of a single XML tag is returned as one "XML_Tag" token.
+    """
+    line = clean_line(line)
+    if is_xml_tag(line):
+        return [(line, "XML_Tag")]
+    return process_tokens(line.split())
+
+
+def write_line(writer, line, offset=None):
+    """
+    Tokenizes a single line into a CoNLL-U or VRT writer, as one sentence, or as a structure tag when the
+    line is a single XML tag. Tokens are grouped by the whitespace separated word they came from.
+    """
+    line = clean_line(line)
+    if not line:
+        return
+    if is_xml_tag(line):
+        writer.tag(line)
+    else:
+        writer.sentence(line, [process_tokens([word]) for word in line.split()], offset)
+
+
+def tokenize_spans(line):
+    """
+    Tokenizes a single raw line, applying CharFix itself, and returns a TokenSpan for every token with its
+    offsets in the line after CharFix and in the raw line, so that callers can slice the line they hold.
+    """
+    fixed, raw_starts, raw_ends = fix_with_offsets(line)
+    text, starts, ends = clean_with_offsets(fixed)
+    if not text:
+        return []
+    if is_xml_tag(text):
+        tokens, spans = [(text, "XML_Tag")], [(0, len(text))]
+    else:
+        tokens, spans = [], []
+        for word in WORD_RE.finditer(text):
+            word_tokens = process_tokens([word.group()])
+            tokens += word_tokens
+            spans += align_tokens([token[0] for token in word_tokens], text, word.start(), word.end())
+    result = []
+    for token, (start, end) in zip(tokens, spans):
+        start, end = map_span(start, end, starts, ends)
+        raw_start, raw_end = map_span(start, end, raw_starts, raw_ends)
+        result.append(TokenSpan(token[0], token[1], start, end, raw_start, raw_end))
+    return result
+
+
+def tokenize(line, return_format, output=False):
+    """
+    Tokenizes a single line and returns the result based on the specified return format. The 'spans' format
+    takes the raw line, see tokenize_spans().
+    """
+    if return_format == 'spans':
+        return tokenize_spans(line)
+    if return_format in STRUCTURED_FORMATS:
+        writer = STRUCTURED_FORMATS[return_format]()
+        write_line(writer, line)
+        return writer.getvalue()
+
     # Strip whitespace and remove any invisible characters
-    line = line.strip().replace('\u200b', '').replace('\ufeff', '')
+    line = clean_line(line)
 
     # Skip processing if the line is empty or contains only invisible characters
     if not line:
         logging.debug("Empty or whitespace-only line encountered. Skipping.")
         pass
 
-    # Updated regex patterns to capture the tag name
-    xml_open_tag = re.match(r'^<\s*/?\s*(\w+)(?:\s+\w+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*/?>$', line)
-    xml_close_tag = re.match(r'^</\s*(\w+)\s*>$', line)
-
-    xml_tag = None
-    if xml_open_tag:
-        xml_tag = (line.strip(), "XML_Tag")
-        logging.debug(f"XML open tag detected: {xml_tag}")
-    elif xml_close_tag:
-        xml_tag = (line.strip(), "XML_Tag")
-        logging.debug(f"XML close tag detected: {xml_tag}")
-
-    if xml_tag:
+    if is_xml_tag(line):
+        xml_tag = (line, "XML_Tag")
+        logging.debug(f"XML tag detected: {xml_tag}")
         # Return the XML tag immediately in the specified format without further tokenization
         if return_format == 'tagged':
-            result = json.dumps({"token": xml_tag[0], "tag": xml_tag[1]}, ensure_ascii=False) if output else "\t".join(
-                xml_tag)
+            result = token_json(*xml_tag) if output else "\t".join(xml_tag)
             logging.debug(f"Returning XML tag: {result}")
             return result
+        elif output and return_format == 'lines':
+            # JSON output stays one JSON value per line
+            return lines_json([xml_tag])
+        elif output and return_format == 'tagged_lines':
+            return tagged_lines_json([xml_tag])
         else:
             logging.debug(f"Returning XML line unchanged: {line}")
             return line  # Return the original XML line unchanged if not in 'tagged' format
@@ -48,21 +168,7 @@ def tokenize(line, return_format, output=False):
         # Proceed with tokenization only if the line is not an XML tag
         tokens = line.split()
         logging.debug(f"Tokens extracted: {tokens}")
-        for token in tokens:
-            try:
-                processed_token = TokenProcessor.process_token(token)
-                if isinstance(processed_token, tuple) and len(processed_token) >= 2:
-                    processed_tokens.append(processed_token)
-                elif isinstance(processed_token, list):
-                    for subtoken in processed_token:
-                        if isinstance(subtoken, tuple) and len(subtoken) >= 2:
-                            processed_tokens.append(subtoken)
-                        #else:
-                        #    logging.error(f"Malformed subtoken detected: {subtoken}")
-                #else:
-                    #logging.error(f"Malformed token detected: {processed_token}")
-            except Exception as e:
-                logging.error(f"Error processing token '{token}': {e}", exc_info=True)
+        processed_tokens = process_tokens(tokens)
 
         # Handle output formats for non-XML tokens
         if return_format == 'tokenized':
@@ -70,25 +176,20 @@ def tokenize(line, return_format, output=False):
 
         elif return_format == 'tagged':
             if output:
-                result = json.dumps(
-                    [{"token": token[0], "tag": token[1]} for token in processed_tokens if len(token) >= 2],
-                    ensure_ascii=False)
+                result = tagged_json([token for token in processed_tokens if len(token) >= 2])
             else:
                 # Only include tokens with the correct structure
                 result = '\n'.join([f"{token[0]}\t{token[1]}" for token in processed_tokens if len(token) >= 2])
 
         elif return_format == 'lines':
             if output:
-                result = json.dumps({"tokens": [token[0] for token in processed_tokens if len(token) >= 1]},
-                                    ensure_ascii=False)
+                result = lines_json([token for token in processed_tokens if len(token) >= 1])
             else:
                 result = ' '.join([token[0] for token in processed_tokens if len(token) >= 1])
 
         elif return_format == 'tagged_lines':
             if output:
-                result = json.dumps(
-                    [{"token": token[0], "tag": token[1] if len(token) > 1 else None} for token in processed_tokens],
-                    ensure_ascii=False)
+                result = tagged_lines_json(processed_tokens)
             else:
                 result = [(token[0], token[1] if len(token) > 1 else None) for token in processed_tokens]
 
@@ -100,85 +201,624 @@ def tokenize(line, return_format, output=False):
         return result
 
 
+DEFAULT_CHUNK_SIZE = 256
+
+
+class LineChunk(list):
+    """
+    A chunk of lines that carries the input offset of its first line, for the sentence IDs of CoNLL-U and VRT.
+    """
+    offset = 0
+
+
+def offset_chunks(chunks):
+    """
+    Turns chunks of lines into LineChunks that know where they start in the input.
+    """
+    offset = 0
+    for lines in chunks:
+        chunk = LineChunk(lines)
+        chunk.offset = offset
+        offset += chunk_bytes(lines)
+        yield chunk
+
+
+def tokenize_structured(lines, return_format, offset=0, source=None):
+    """
+    Tokenizes a chunk of raw lines into CoNLL-U or VRT inside a worker. Every line is a sentence, identified
+    by its input offset, prefixed with the source file in corpus mode.
+    """
+    writer = STRUCTURED_FORMATS[return_format](source)
+    for line in lines:
+        COUNTS.lines += 1
+        size = len(line.encode('utf-8'))
+        try:
+            write_line(writer, CharFix.fix(line), offset)
+        except Exception as e:
+            logging.error(f"Error processing line: {e}", exc_info=True)
+        offset += size
+    return writer.getvalue()
+
+
+def tokenize_ids(lines):
+    """
+    Tokenizes a chunk of raw lines inside a worker into chunk-local token and tag IDs, see ChunkIds.
+    """
+    chunk = ChunkIds()
+    for line in lines:
+        COUNTS.lines += 1
+        line = CharFix.fix(line)
+        if not line:
+            continue
+        try:
+            chunk.add_line(tokenize_tokens(line))
+        except Exception as e:
+            logging.error(f"Error processing line: {e}", exc_info=True)
+    return chunk.result()
+
+
+def tokenize_chunk(lines, return_format, output=False, offset=None, source=None):
+    """
+    Tokenizes a chunk of raw lines inside a worker and packs the results into a single string,
+    so that a whole chunk costs one task submission and one result transfer.
+    """
+    if return_format == 'ids':
+        return tokenize_ids(lines)
+    if return_format in STRUCTURED_FORMATS:
+        return tokenize_structured(lines, return_format, getattr(lines, 'offset', 0) if offset is None else offset,
+                                   source)
+    results = []
+    for line in lines:
+        COUNTS.lines += 1
+        line = CharFix.fix(line)  # Apply CharFix without stripping spaces for XML tags
+        if not line:  # Only process non-empty lines. Do not change
+            continue
+        try:
+            result = tokenize(line, return_format, output)
+        except Exception as e:
+            logging.error(f"Error processing line: {e}", exc_info=True)
+            continue
+        if result is not None:
+            results.append(str(result))
+    return "\n".join(results) if results else None
+
+
+def tokenize_range(byte_range, filename, return_format, output=False):
+    """
+    Reads and tokenizes a newline aligned byte range of a memory mapped file inside a worker.
+    """
+    start, end = byte_range
+    return tokenize_chunk(read_range(filename, start, end), return_format, output, offset=start)
+
+
+def tokenize_files(unit, return_format, output=False):
+    """
+    Tokenizes a corpus work unit of (path, relative_path, start, end) byte ranges inside a worker and
+    returns one packed result per range. An end of None stands for a whole compressed file.
+    """
+    results = []
+    for path, relpath, start, end in unit:
+        if end is None:
+            with open_input(path, threaded=False) as in_file:
+                results.append(tokenize_chunk(in_file, return_format, output, offset=0, source=relpath))
+        elif end > start:
+            results.append(tokenize_chunk(read_range(path, start, end), return_format, output, offset=start,
+                                          source=relpath))
+        else:
+            results.append(None)
+    return results
+
+
+def chunk_bytes(chunk):
+    """
+    Returns the input size of a chunk: a list of lines, a (start, end) byte range or a corpus work unit.
+    """
+    if isinstance(chunk, tuple):
+        return chunk[1] - chunk[0]
+    if chunk and isinstance(chunk[0], tuple):
+        return sum((os.path.getsize(path) if end is None else end) - start for path, _, start, end in chunk)
+    return sum(len(line.encode('utf-8')) for line in chunk)
+
+
+def measure_chunk(chunk, func, *args):
+    """
+    Runs a worker function on a chunk and returns its result together with the ChunkStats of the chunk.
+    """
+    lines, tokens = COUNTS.lines, COUNTS.tokens
+    started = time.perf_counter()
+    result = func(chunk, *args)
+    seconds = time.perf_counter() - started
+    stats = ChunkStats((os.getpid(), threading.get_ident()), COUNTS.lines - lines, COUNTS.tokens - tokens,
+                       chunk_bytes(chunk), seconds, TOKEN_CACHE.hits, TOKEN_CACHE.misses)
+    return result, stats
+
+
+def iter_chunks(lines, chunk_size):
+    """
+    Groups an iterable of lines into lists of at most chunk_size lines.
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_chunks(executor, func, chunks, args=(), max_in_flight=1, ordered=True):
+    """
+    Submits chunks to the executor while keeping at most max_in_flight of them pending and yields
+    (seq, chunk, result) tuples. In ordered mode results follow the input order, otherwise they are
+    yielded as soon as they complete. Failed chunks are logged and yielded with a None result.
+    """
+    chunks = iter(chunks)
+    pending = collections.deque() if ordered else {}
+    seq = 0
+
+    def fill():
+        nonlocal seq
+        while len(pending) < max_in_flight:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            future = executor.submit(func, chunk, *args)
+            if ordered:
+                pending.append((seq, chunk, future))
+            else:
+                pending[future] = (seq, chunk)
+            seq += 1
+
+    def collect(future):
+        try:
+            return future.result()
+        except Exception as e:
+            logging.error(f"Error processing chunk: {e}", exc_info=True)
+            return None
+
+    fill()
+    while pending:
+        if ordered:
+            chunk_seq, chunk, future = pending.popleft()
+            result = collect(future)
+            fill()
+            yield chunk_seq, chunk, result
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            completed = sorted((pending.pop(future) + (future,) for future in done), key=lambda item: item[0])
+            fill()
+            for chunk_seq, chunk, future in completed:
+                yield chunk_seq, chunk, collect(future)
+
+
+def tag_sequence(seq, result):
+    """
+    Prefixes every output line of a chunk with its sequence number, so that
+    `sort -s -n -k1,1 | cut -f2-` restores the input order of unordered output.
+    """
+    return "\n".join(f"{seq}\t{line}" for line in result.split("\n"))
+
+
+def tokenize_tokens_chunk(lines):
+    """
+    Worker counterpart of iter_tokenize: returns one list of (token, tag) tuples per input line.
+    """
+    return [tokenize_tokens(CharFix.fix(line)) for line in lines]
+
+
+def tokenize_batch(lines):
+    """
+    Worker counterpart of iter_token_batches: returns the tokens of a chunk of lines as one TokenBatch.
+    """
+    return TokenBatch.from_lines(tokenize_tokens(CharFix.fix(line)) for line in lines)
+
+
+def tokenize_lines(lines, return_format, output=False, fix_chars=False):
+    """
+    Worker counterpart of the async API: returns the tokenize() result of every line, or the exception it raised.
+    With fix_chars, CharFix is applied first, as ts_tokenize does.
+    """
+    results = []
+    for line in lines:
+        try:
+            if fix_chars and return_format != 'spans':
+                line = CharFix.fix(line)
+            results.append(tokenize(line, return_format, output))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def iter_tokenize(lines, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, max_in_flight=None, start_method=None,
+                  executor=None, backend=DEFAULT_BACKEND):
+    """
+    Lazily tokenizes an iterable of lines (a list, a generator or an open file) and yields one list of
+    (token, tag) tuples per input line, in input order. With workers > 1 the lines are tokenized in
+    chunks by a pool of the given backend, otherwise in the calling process. An existing executor is used
+    as is.
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    if executor is None and (workers is None or workers <= 1):
+        for line in lines:
+            yield tokenize_tokens(CharFix.fix(line))
+        return
+
+    for batch in iter_token_batches(lines, workers, chunk_size, max_in_flight, start_method, executor, backend):
+        yield from batch.tolist()
+
+
+def iter_token_batches(lines, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, max_in_flight=None, start_method=None,
+                       executor=None, backend=DEFAULT_BACKEND):
+    """
+    Like iter_tokenize(), but yields one TokenBatch per chunk of chunk_size lines instead of lists of tuples.
+    Workers send the batches back as a few flat buffers, which is much cheaper than pickling every tuple.
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    if executor is None and (workers is None or workers <= 1):
+        for chunk in iter_chunks(lines, chunk_size):
+            yield tokenize_batch(chunk)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = 2 * (workers or 1)
+
+    with use_executor(executor, workers, start_method, backend) as executor:
+        chunks = iter_chunks(lines, chunk_size)
+        for _, chunk, result in run_chunks(executor, tokenize_batch, chunks, max_in_flight=max_in_flight):
+            if result is None:
+                # The chunk failed and was logged, keep one entry per input line
+                result = TokenBatch.from_lines([] for _ in chunk)
+            yield result
+
+
 class TSTokenizer:
+    """
+    Tokenizer that owns a worker pool and its configuration. The pool is started on first use and serves
+    every following call from warm workers until close(), so calling it once per document does not pay for
+    starting processes and loading lexicons again. ts_tokenize() can still be called statically for one-off
+    runs. The backend selects process, thread, interpreter or serial workers, see create_executor().
+    """
+
+    def __init__(self, num_workers=None, output_format='tokenized', output=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_in_flight=None, start_method=None, backend=DEFAULT_BACKEND, cache_size=None, disk_cache=None):
+        if backend == 'serial':
+            num_workers = 1
+        elif num_workers is None:
+            num_workers = max(multiprocessing.cpu_count() - 1, 1)
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be a positive integer, got {chunk_size}")
+        self.num_workers = num_workers
+        self.output_format = output_format
+        self.output = output
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or 2 * num_workers
+        self.start_method = start_method
+        self.backend = backend
+        self.cache_size = cache_size
+        self.disk_cache = disk_cache
+        self._executor = None
+        # The cache settings of this process while the pool is running, see close()
+        self._settings = contextlib.ExitStack()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._settings.enter_context(use_cache_size(self.cache_size))
+            self._settings.enter_context(use_disk_cache(self.disk_cache))
+            self._executor = create_executor(self.num_workers, self.start_method, self.backend)
+        return self._executor
+
+    def tokenize_lines(self, lines, output_format=None):
+        """
+        Tokenizes an iterable of lines after applying CharFix, as ts_tokenize does, and returns one result
+        per line in the tokenize() format. Lines that fail are logged and returned as None.
+        """
+        args = (output_format or self.output_format, self.output, True)
+        results = []
+        for _, chunk, result in run_chunks(self.executor, tokenize_lines, iter_chunks(lines, self.chunk_size),
+                                           args=args, max_in_flight=self.max_in_flight):
+            for line_result in result or [None] * len(chunk):
+                if isinstance(line_result, Exception):
+                    logging.error(f"Error processing line: {line_result}")
+                    line_result = None
+                results.append(line_result)
+        return results
+
+    def tokenize_text(self, text, output_format=None):
+        """
+        Tokenizes every line of a text and returns one result per line.
+        """
+        return self.tokenize_lines(text.splitlines(), output_format)
+
+    def iter_tokenize(self, lines):
+        """
+        Yields one list of (token, tag) tuples per input line, like iter_tokenize(), from the warm workers.
+        """
+        return iter_tokenize(lines, self.num_workers, self.chunk_size, self.max_in_flight, executor=self.executor)
+
+    def iter_batches(self, lines):
+        """
+        Yields one TokenBatch per chunk of lines, like iter_token_batches(), from the warm workers.
+        """
+        return iter_token_batches(lines, self.num_workers, self.chunk_size, self.max_in_flight,
+                                  executor=self.executor)
+
+    def tokenize_file(self, filename=None, **options):
+        """
+        Runs ts_tokenize() on the warm workers with this tokenizer's configuration. Takes the same options,
+        e.g. output_file, inputs and output_dir for a corpus, or input_file for text or an open stream.
+        """
+        options.setdefault('output_format', self.output_format)
+        options.setdefault('output', self.output)
+        options.setdefault('chunk_size', self.chunk_size)
+        options.setdefault('max_in_flight', self.max_in_flight)
+        TSTokenizer.ts_tokenize(filename=filename, num_workers=self.num_workers, executor=self.executor, **options)
+
+    def close(self):
+        """
+        Shuts down the worker pool, detaches the cache file and restores the cache size of this process. The next
+        call starts a new pool.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            flush_disk_cache()
+        self._settings.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @staticmethod
-    def ts_tokenize(input_file=None, filename=None, output_format='tokenized', num_workers=None, verbose=False, output=False):
-        if num_workers is None:
-            num_workers = multiprocessing.cpu_count() - 1
+    def ts_tokenize(input_file=None, filename=None, output_format='tokenized', num_workers=None, verbose=False,
+                    output=False, chunk_size=DEFAULT_CHUNK_SIZE, max_in_flight=None, ordered=True,
+                    output_file=None, rotate_bytes=None, rotate_lines=None, mmap_input=False,
+                    range_size=DEFAULT_RANGE_SIZE, inputs=None, output_dir=None, batch_bytes=DEFAULT_BATCH_BYTES,
+                    checkpoint=None, resume=False, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+                    start_method=None, executor=None, backend=DEFAULT_BACKEND, documents=False, hash_bits=None,
+                    shard_tokens=DEFAULT_SHARD_TOKENS, cache_size=None, disk_cache=None):
+        if backend == 'serial' and executor is None:
+            num_workers = 1
+        elif num_workers is None:
+            num_workers = max(multiprocessing.cpu_count() - 1, 1)
             logging.debug(f"Number of workers set to {num_workers}")
 
-        # Case 1: Handle piped input directly (input_text is provided)
-        if input_file:
-            logging.info("Processing input from stdin.")
-            for line in input_file.splitlines():
-                result = tokenize(line, output_format, output)
+        if max_in_flight is None:
+            # Two chunks per worker keep every worker busy while the parent writes results
+            max_in_flight = 2 * max(num_workers, 1)
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be a positive integer, got {max_in_flight}")
+
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be a positive integer, got {chunk_size}")
+
+        if range_size is None:
+            range_size = DEFAULT_RANGE_SIZE
+
+        if cache_size is not None and cache_size < 0:
+            raise ValueError(f"cache_size must not be negative, got {cache_size}")
+
+        if filename and output_dir and inputs is None:
+            inputs = [filename]
+
+        if output_format == 'ids':
+            # Token IDs are written as .npy shards named after the output file
+            if not output_file:
+                raise ValueError("The ids output format needs an output file, used as the prefix of the shards")
+            if output_dir or checkpoint or resume or not ordered or rotate_bytes or rotate_lines:
+                raise ValueError("The ids output format cannot be combined with an output directory, checkpoints, "
+                                 "unordered output or rotation")
+
+        if inputs:
+            if not ordered:
+                raise ValueError("Corpus mode writes the outputs in input order and cannot be combined with "
+                                 "unordered output")
+            logging.info(f"Processing corpus: {inputs}")
+            files = expand_inputs(inputs)
+            if output_dir:
+                # Checked before the checkpoint or any output file is opened
+                files = check_relpaths(files)
+
+        # A checkpoint records the committed chunks, so that an interrupted run can be resumed
+        if resume and checkpoint is None:
+            checkpoint = default_checkpoint_path(output_file, output_dir)
+        if checkpoint:
+            if not ordered:
+                raise ValueError("Checkpoints require ordered output")
+            if not output_file and not output_dir:
+                raise ValueError("Checkpoints need an output file or an output directory")
+            # A compressed stream cannot be truncated to the checkpoint and appended to, see reopen_output()
+            if output_file and output_compression(output_file):
+                raise ValueError(f"Checkpoints cannot be used with a compressed output file: {output_file}")
+            if output_dir and inputs:
+                # Compressed inputs are written whole in one go and never resumed in the middle
+                resumable = [relpath for path, relpath in files
+                             if output_compression(relpath) and not is_compressed(path)]
+                if resumable:
+                    raise ValueError(f"Checkpoints cannot be used with compressed output files: {resumable[0]}")
+            config = dict(inputs=inputs, filename=filename, input_size=os.path.getsize(filename) if filename else None,
+                          piped=input_file is not None, mmap_input=mmap_input, output_format=output_format,
+                          output=output, chunk_size=chunk_size, range_size=range_size, batch_bytes=batch_bytes,
+                          output_file=output_file, output_dir=output_dir, rotate_bytes=rotate_bytes,
+                          rotate_lines=rotate_lines)
+            if documents:
+                config.update(documents=True)
+            checkpoint = Checkpoint.open(checkpoint, config, resume=resume, interval=checkpoint_interval)
+            resume_from = checkpoint.output if not output_dir else None
+        else:
+            resume_from = None
+
+        # With verbose, progress is reported in input bytes, so no extra pass over the input is needed
+        report = None
+
+        # In document mode, work units hold whole XML/VRT documents of about range_size bytes, and only
+        # documents larger than that are split, at paragraph tags
+        split_ranges = document_ranges if documents else byte_ranges
+
+        # The workers are started first: the sink and the input may start background threads to compress and
+        # decompress, and a worker forked while one of them holds a lock would block on that lock for good.
+        # The cache settings are made before as well, the workers take the size and the cache file of this
+        # process's cache, and they are restored at the end.
+        with use_cache_size(cache_size), use_disk_cache(disk_cache), \
+                use_executor(executor, num_workers, start_method, backend) as executor:
+            # Results are written through a buffered sink: stdout, a single file or rotating part files
+            if output_format == 'ids':
+                sink = TokenIdWriter(output_file, hash_bits=hash_bits, shard_tokens=shard_tokens)
+            else:
+                sink = open_sink(output_file, max_bytes=rotate_bytes, max_lines=rotate_lines, resume_from=resume_from)
+            with sink, contextlib.ExitStack() as cleanup:
+                # The progress report is closed after an error or an interrupt as well, not to leave its bar drawn
+                cleanup.callback(lambda: report and report.close())
+
+                # Case 0: Handle a corpus of files, directories, glob patterns or @list files
+                if inputs:
+                    if verbose:
+                        files = list(files)
+                        report = ProgressReport(sum(os.path.getsize(path) for path, _ in files), num_workers,
+                                                desc="Processing Corpus")
+                    units = corpus_units(files, batch_bytes=batch_bytes, range_size=range_size, split=split_ranges)
+                    TSTokenizer._process_corpus(units, output_format, output, sink, output_dir, num_workers,
+                                                max_in_flight, checkpoint, report, start_method, executor, backend)
+
+                # Case 1: Handle piped input (a file object such as sys.stdin, or the text itself)
+                elif input_file:
+                    logging.info("Processing input from stdin.")
+                    if isinstance(input_file, str):
+                        input_file = io.StringIO(input_file)
+                    if verbose:
+                        report = ProgressReport(None, num_workers, desc="Processing Input")
+                    if documents:
+                        chunks = document_chunks(input_file, range_size)
+                    else:
+                        chunks = iter_chunks(input_file, chunk_size)
+                    if output_format in STRUCTURED_FORMATS:
+                        chunks = offset_chunks(chunks)
+                    TSTokenizer._process_chunks(chunks, tokenize_chunk,
+                                                (output_format, output), sink, num_workers, max_in_flight, ordered,
+                                                report, checkpoint=checkpoint, start_method=start_method,
+                                                executor=executor, backend=backend)
+
+                # Case 2: Handle file input through a memory map; workers read their own byte ranges
+                elif filename and mmap_input and not is_compressed(filename):
+                    logging.info(f"Processing memory mapped file: {filename}")
+                    if verbose:
+                        # Byte ranges skipped on resume count as done
+                        report = ProgressReport(os.path.getsize(filename), num_workers, desc="Processing File",
+                                                initial=checkpoint.input_position if checkpoint else 0)
+                    TSTokenizer._process_chunks(split_ranges(filename, range_size), tokenize_range,
+                                                (filename, output_format, output), sink, num_workers, max_in_flight,
+                                                ordered, report, progress=chunk_bytes, checkpoint=checkpoint,
+                                                start_method=start_method, executor=executor, backend=backend)
+
+                # Case 3: Handle file input (filename is provided)
+                elif filename:
+                    if mmap_input:
+                        logging.info(f"{filename} is compressed and cannot be memory mapped, reading it as a stream.")
+                    logging.info(f"Processing file: {filename}")
+                    # Compressed files are decompressed on the fly in a background thread
+                    with open_input(filename) as in_file:
+                        if verbose:
+                            # Progress counts decompressed bytes, so the size is only known for plain files.
+                            # The lines skipped on resume are not counted.
+                            total = None if is_compressed(filename) or (checkpoint and checkpoint.chunks) \
+                                else os.path.getsize(filename)
+                            report = ProgressReport(total, num_workers, desc="Processing File")
+                        chunks = document_chunks(in_file, range_size) if documents else iter_chunks(in_file, chunk_size)
+                        if output_format in STRUCTURED_FORMATS:
+                            chunks = offset_chunks(chunks)
+                        TSTokenizer._process_chunks(chunks, tokenize_chunk,
+                                                    (output_format, output), sink, num_workers, max_in_flight, ordered,
+                                                    report, checkpoint=checkpoint, start_method=start_method,
+                                                    executor=executor, backend=backend)
+
+    @staticmethod
+    def _process_corpus(units, output_format, output, sink, output_dir, num_workers, max_in_flight,
+                        checkpoint=None, report=None, start_method=None, executor=None, backend=DEFAULT_BACKEND):
+        """
+        Tokenizes corpus work units on one persistent pool. Results are written to the mirrored file
+        under output_dir, or concatenated into the sink when no output directory is given.
+        """
+        resume_from = checkpoint.output if checkpoint and output_dir else None
+        with use_executor(executor, num_workers, start_method, backend) as executor, \
+                MirroredOutput(output_dir, open_sink, resume_from=resume_from) as mirrored:
+            if checkpoint:
+                units = checkpoint.skip(units)
+            func, args = TSTokenizer._measured(tokenize_files, (output_format, output), report)
+            for _, unit, results in run_chunks(executor, func, units, args=args, max_in_flight=max_in_flight):
+                results = TSTokenizer._report(results, report)
+                if results is None:
+                    results = [None] * len(unit)
+                for (_, relpath, _, end), result in zip(unit, results):
+                    if output_dir:
+                        mirrored.write(relpath, result)
+                        if end is None:
+                            # A compressed input is a single entry, so its output file is complete
+                            mirrored.close()
+                    elif result is not None:
+                        sink.write(result)
+                if checkpoint:
+                    checkpoint.advance(len(unit), mirrored.sync if output_dir else sink.sync)
+            if output_dir:
+                logging.info(f"Wrote {mirrored.files_written} files to {output_dir}")
+        if checkpoint:
+            sink.sync()
+            checkpoint.finish()
+
+    @staticmethod
+    def _process_chunks(chunks, func, args, sink, num_workers, max_in_flight, ordered, report=None, progress=len,
+                        checkpoint=None, start_method=None, executor=None, backend=DEFAULT_BACKEND):
+        """
+        Streams chunks through the worker pool and writes the packed results to the sink. Chunks are
+        consumed lazily, so inputs that do not fit in memory are fine. With a checkpoint, chunks that
+        were committed by an interrupted run are skipped and progress is recorded as chunks are written.
+        """
+        if checkpoint:
+            chunks = checkpoint.skip(chunks)
+
+        func, args = TSTokenizer._measured(func, args, report)
+        with use_executor(executor, num_workers, start_method, backend) as executor:
+            # Workers receive whole chunks and return one packed result per chunk.
+            # At most max_in_flight chunks are pending, so memory stays bounded.
+            for seq, chunk, result in run_chunks(executor, func, chunks, args=args,
+                                                 max_in_flight=max_in_flight, ordered=ordered):
+                result = TSTokenizer._report(result, report)
                 if result is not None:
-                    print(result)
-            return
-
-        # Case 2: Handle file input (filename is provided)
-        if filename:
-            logging.info(f"Processing file: {filename}")
-            with open(filename, 'r', encoding='utf-8') as in_file:
-                # If verbose mode is enabled, initialize progress bar
-                if verbose:
-                    total_lines = sum(1 for _ in in_file)
-                    in_file.seek(0)
-                    logging.debug(f"Total lines in file: {total_lines}")
-                    pbar = tqdm(total=total_lines, desc="Processing File")
-                else:
-                    pbar = None
-
-                with ProcessPoolExecutor(max_workers=num_workers) as executor:
-                    batch_size = 100
-                    batch = []
-
-                    # Process the file line by line
-                    for line in in_file:
-                        line = CharFix.fix(line)  # Apply CharFix without stripping spaces for XML tags
-
-                        if line:  # Only process non-empty lines. Do not change
-                            batch.append(line)
-                        else:
-                            pass
-
-                        # When the batch size is reached, process the batch in parallel
-                        if len(batch) >= batch_size:
-                            logging.debug(f"Processing batch of size {len(batch)}")
-                            futures = [executor.submit(tokenize, line, output_format, output) for line in batch]
-                            for future in futures:
-                                try:
-                                    result = future.result()
-                                    if result is not None:
-                                        print(result)
-                                except Exception as e:
-                                    logging.error(f"Error processing line: {e}", exc_info=True)
-                            batch = []  # Clear batch after processing
-
-                        # Update progress bar if verbose mode is enabled
-                        if pbar:
-                            pbar.update(min(len(batch), batch_size))
-
-                    # Process remaining lines in the last batch
-                    if batch:
-                        logging.debug(f"Processing final batch of size {len(batch)}")
-                        futures = [executor.submit(tokenize, line, output_format, output) for line in batch]
-                        for future in futures:
-                            try:
-                                result = future.result()
-                                if result is not None:
-                                    print(result)
-                            except Exception as e:
-                                logging.error(f"Error processing line: {e}", exc_info=True)
-
-                        # Update progress bar for the remaining lines
-                        if pbar:
-                            pbar.update(len(batch))
-
-                # Close the progress bar if it was initialized
-                if pbar:
-                    pbar.close()
+                    sink.write(result if ordered else tag_sequence(seq, result))
+
+                if checkpoint:
+                    checkpoint.advance(progress(chunk), sink.sync)
+
+        if checkpoint:
+            sink.sync()
+            checkpoint.finish()
+
+
+    @staticmethod
+    def _measured(func, args, report):
+        """
+        Wraps a worker function in measure_chunk when progress is reported.
+        """
+        return (measure_chunk, (func,) + tuple(args)) if report else (func, args)
+
+    @staticmethod
+    def _report(result, report):
+        """
+        Passes the stats of a measured chunk to the progress report and returns the plain result.
+        """
+        if report is None or result is None:
+            return result
+        result, stats = result
+        report.update(stats)
+        return result
 
 
 if __name__ == "__main__":
@@ -1,5 +1,58 @@
+import gc
+import io
+import os
+import sys
+import gzip
+import json
+import pickle
+import random
+import signal
+import socket
+import time
+import sqlite3
+import asyncio
+import subprocess
+import tempfile
 import unittest
-from ts_tokenizer.tokenizer import tokenize
+import threading
+import multiprocessing
+from unittest import mock
+from array import array
+from ts_tokenizer.tokenizer import tokenize, tokenize_chunk, iter_tokenize, iter_token_batches, run_chunks, TSTokenizer
+from ts_tokenizer.char_fix import CharFix
+from ts_tokenizer.aio import AsyncTokenizer
+from ts_tokenizer.server import TokenizerServer, is_socket
+from ts_tokenizer.documents import document_chunks
+from ts_tokenizer.token_ids import TokenIdWriter
+from ts_tokenizer.token_batch import Tag
+from ts_tokenizer.token_cache import TOKEN_CACHE, set_cache_size
+from ts_tokenizer.disk_cache import disk_cache_path, decode_result
+from ts_tokenizer.token_handler import TokenProcessor, TokenPreProcess, token_signature, applicable_checks, regex
+from ts_tokenizer.token_context import TokenContext
+from ts_tokenizer.checkpoint import Checkpoint
+from ts_tokenizer.progress import ProgressReport
+from ts_tokenizer.output_sink import FileSink, RotatingFileSink, part_path
+from ts_tokenizer.worker_pool import create_executor, worker_context
+from ts_tokenizer.compressed_io import open_input, open_output, detect_compression, PrefetchReader, BackgroundWriter
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cli(*args, stdin=b""):
+    """
+    Runs the command line tool in a new process with the given bytes piped to its stdin and returns the exit
+    code, stdout and stderr.
+    """
+    with subprocess.Popen([sys.executable, "-m", "ts_tokenizer.cli", *args], stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=PROJECT_DIR,
+                          start_new_session=True) as process:
+        try:
+            stdout, stderr = process.communicate(stdin, timeout=60)
+        except subprocess.TimeoutExpired:
+            # Workers left behind would keep the pipes open
+            os.killpg(process.pid, signal.SIGKILL)
+            raise
+    return process.returncode, stdout, stderr
 
 
 class TestTSTokenizer(unittest.TestCase):
@@ -17,6 +70,487 @@ class TestTSTokenizer(unittest.TestCase):
         self.assertIsNotNone(result, "The result should not be None")
         self.assertEqual(result, expected_output)
 
+    def test_tokenize_chunk(self):
+        lines = ["Parça ve bütün ilişkisi.\n", "\n", "Parça ve bütün.\n"]
+        expected_output = "\n".join(str(tokenize(line, "tagged")) for line in lines)
+        result = tokenize_chunk(lines, "tagged")
+
+        self.assertEqual(result, expected_output)
+
+    def test_iter_tokenize(self):
+        lines = ["Parça ve bütün ilişkisi.", "<doc>"]
+        expected_output = [
+            [("Parça", "Valid_Word"), ("ve", "Valid_Word"), ("bütün", "Valid_Word"), ("ilişkisi", "Valid_Word"),
+             (".", "Punc")],
+            [("<doc>", "XML_Tag")],
+        ]
+        result = list(iter_tokenize(lines))
+
+        self.assertEqual(result, expected_output)
+
+    def test_output_sinks(self):
+        def read(path):
+            with open(path, encoding="utf-8") as in_file:
+                return in_file.read()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "out.txt")
+            with FileSink(path) as sink:
+                for record in ["a", "b\nc"]:
+                    sink.write(record)
+            self.assertEqual(read(path), "a\nb\nc\n")
+
+            with RotatingFileSink(path, max_lines=2) as sink:
+                for record in ["a", "b", "c\nd", "e"]:
+                    sink.write(record)
+            self.assertEqual(sink.part_paths, [os.path.join(tmp_dir, f"out-0000{i}.txt") for i in range(3)])
+            self.assertEqual([read(part) for part in sink.part_paths], ["a\nb\n", "c\nd\n", "e\n"])
+
+            path = os.path.join(tmp_dir, "bytes.tar.txt")
+            with RotatingFileSink(path, max_bytes=5) as sink:
+                for record in ["abc", "de", "f", "gh\nij"]:
+                    sink.write(record)
+            self.assertEqual(sink.part_paths[1], os.path.join(tmp_dir, "bytes-00001.tar.txt"))
+            self.assertEqual([read(part_path(path, i)) for i in range(4)], ["abc\n", "de\nf\n", "gh\n", "ij\n"])
+
+    def test_mmap_rewritten_file(self):
+        texts = ["Parça ve bütün.\n", "Bütün ve parça ilişkisi.\nParça ve bütün ilişkisi.\n"]
+        with tempfile.TemporaryDirectory() as tmp_dir, TSTokenizer(num_workers=1, output_format="tagged") as tokenizer:
+            path, out_path = os.path.join(tmp_dir, "in.txt"), os.path.join(tmp_dir, "out.txt")
+            for text in texts:
+                # Rewritten in place, so the file keeps its inode
+                with open(path, "w", encoding="utf-8") as in_file:
+                    in_file.write(text)
+                tokenizer.tokenize_file(path, mmap_input=True, range_size=16, output_file=out_path)
+                with open(out_path, encoding="utf-8") as out_file:
+                    self.assertEqual(out_file.read(), "".join(tokenize(line, "tagged") + "\n"
+                                                              for line in text.splitlines()))
+
+    def test_corpus_output_collisions(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inputs = []
+            for directory in ("a", "b"):
+                os.makedirs(os.path.join(tmp_dir, directory))
+                inputs.append(os.path.join(tmp_dir, directory, "x.txt"))
+                with open(inputs[-1], "w", encoding="utf-8") as in_file:
+                    in_file.write("Parça ve bütün.\n")
+            output_dir = os.path.join(tmp_dir, "out")
+            with self.assertRaisesRegex(ValueError, "x.txt"):
+                TSTokenizer.ts_tokenize(inputs=inputs, output_dir=output_dir, backend="serial")
+            self.assertFalse(os.path.exists(output_dir))
+            with self.assertRaises(ValueError):
+                TSTokenizer.ts_tokenize(inputs=inputs, ordered=False, backend="serial")
+
+    def test_compressed_io(self):
+        text = "Parça ve bütün ilişkisi.\n" * 1000
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for extension, compression in [(".gz", "gzip"), (".bz2", "bz2"), (".xz", "xz")]:
+                path = os.path.join(tmp_dir, "out.txt" + extension)
+                with open_output(path) as out_file:
+                    out_file.write(text.encode("utf-8"))
+                # Detected from the magic bytes, not the name
+                os.rename(path, os.path.join(tmp_dir, "in.txt"))
+                path = os.path.join(tmp_dir, "in.txt")
+                self.assertEqual(detect_compression(path), compression)
+                with open_input(path) as in_file:
+                    self.assertEqual(in_file.read(), text)
+
+        with PrefetchReader(io.BytesIO(b"abcdefgh"), block_size=3) as reader:
+            self.assertEqual(io.BufferedReader(reader).read(), b"abcdefgh")
+
+        class FailingStream(io.BytesIO):
+            def write(self, data):
+                raise OSError("disk full")
+
+        writer = BackgroundWriter(FailingStream())
+        writer.write(b"lost")
+        with self.assertRaisesRegex(OSError, "disk full"):
+            writer.close()
+
+    def test_checkpoint_resume(self):
+        save = Checkpoint.save
+
+        def interrupted_save(checkpoint, output):
+            # The output of the 5th chunk is written, but the run stops before it is checkpointed
+            if checkpoint.chunks > 4:
+                raise KeyboardInterrupt
+            save(checkpoint, output)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "in.txt")
+            with open(path, "w", encoding="utf-8") as in_file:
+                in_file.writelines(f"Parça ve bütün ilişkisi {i}.\n" for i in range(60))
+            for rotation in ({}, {"rotate_lines": 17}):
+                options = dict(filename=path, output_format="tagged", backend="serial", chunk_size=5,
+                               checkpoint_interval=0, **rotation)
+                expected, resumed = os.path.join(tmp_dir, "expected.txt"), os.path.join(tmp_dir, "resumed.txt")
+                TSTokenizer.ts_tokenize(output_file=expected, **options)
+                with mock.patch.object(Checkpoint, "save", interrupted_save), self.assertRaises(KeyboardInterrupt):
+                    TSTokenizer.ts_tokenize(output_file=resumed, checkpoint=resumed + ".checkpoint", **options)
+                written = resumed
+                if rotation:
+                    parts = 0
+                    while os.path.exists(part_path(resumed, parts + 1)):
+                        parts += 1
+                    written = part_path(resumed, parts)
+                with open(written, "ab") as out_file:
+                    out_file.write("Parça\tVal".encode("utf-8"))  # A partly written line
+                TSTokenizer.ts_tokenize(output_file=resumed, resume=True, **options)
+                self.assertFalse(os.path.exists(resumed + ".checkpoint"))
+                for index in range(4 if rotation else 1):
+                    names = (part_path(expected, index), part_path(resumed, index)) if rotation else (expected, resumed)
+                    with open(names[0], "rb") as expected_file, open(names[1], "rb") as resumed_file:
+                        self.assertEqual(resumed_file.read(), expected_file.read())
+            with self.assertRaisesRegex(ValueError, "compressed"):
+                TSTokenizer.ts_tokenize(filename=path, output_file=os.path.join(tmp_dir, "out.txt.gz"),
+                                        checkpoint=os.path.join(tmp_dir, "out.checkpoint"), backend="serial")
+
+    def test_progress_bytes(self):
+        close = ProgressReport.close
+        totals = []
+
+        def recording_close(report):
+            totals.append((report.pbar.n, report.pbar.total))
+            close(report)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "in.txt")
+            with open(path, "w", encoding="utf-8") as in_file:
+                in_file.write("".join(f"Parça ve bütün ilişkisi {i}.\n" for i in range(50)) + "Son satır")
+            size = os.path.getsize(path)
+            with mock.patch.object(ProgressReport, "close", recording_close):
+                for mmap_input in (True, False):
+                    TSTokenizer.ts_tokenize(filename=path, output_file=os.path.join(tmp_dir, "out.txt"),
+                                            num_workers=2, verbose=True, mmap_input=mmap_input, range_size=100,
+                                            chunk_size=7)
+                # The report is closed after an interrupt too
+                with mock.patch.object(TSTokenizer, "_process_chunks", side_effect=KeyboardInterrupt):
+                    with self.assertRaises(KeyboardInterrupt):
+                        TSTokenizer.ts_tokenize(filename=path, output_file=os.path.join(tmp_dir, "out.txt"),
+                                                backend="serial", verbose=True)
+        self.assertEqual(totals, [(size, size), (size, size), (0, size)])
+
+    def test_worker_start(self):
+        # Choosing the start method does not fix the one of the program
+        if multiprocessing.get_start_method(allow_none=True) is None:
+            worker_context(None)
+            self.assertIsNone(multiprocessing.get_start_method(allow_none=True))
+        self.assertEqual(worker_context("spawn").get_start_method(), "spawn")
+        if "fork" in multiprocessing.get_all_start_methods():
+            # Objects are frozen while the workers are forked only
+            freeze_count = gc.get_freeze_count()
+            with create_executor(2, start_method="fork") as executor:
+                self.assertEqual(executor.submit(len, "abc").result(), 3)
+                self.assertEqual(gc.get_freeze_count(), freeze_count)
+
+    def test_workers_before_threads(self):
+        # A default of fork is not used while other threads are running
+        if multiprocessing.get_start_method(allow_none=True) is None and \
+                multiprocessing.get_all_start_methods()[0] == "fork":
+            stop = threading.Event()
+            thread = threading.Thread(target=stop.wait)
+            thread.start()
+            try:
+                self.assertEqual(worker_context(None).get_start_method(), "forkserver")
+            finally:
+                stop.set()
+                thread.join()
+        # The workers are started before the threads that decompress the input and compress the output
+        threads = []
+
+        def recording_create_executor(*args):
+            threads.extend(thread.name for thread in threading.enumerate() if thread.name.startswith("ts-tokenizer"))
+            return create_executor(*args)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "in.txt.gz")
+            with gzip.open(path, "wt", encoding="utf-8") as in_file:
+                in_file.write("".join(f"Parça ve bütün ilişkisi {i}.\n" for i in range(50)))
+            with mock.patch("ts_tokenizer.worker_pool.create_executor", recording_create_executor):
+                TSTokenizer.ts_tokenize(filename=path, output_file=os.path.join(tmp_dir, "out.txt.gz"), num_workers=2)
+            with gzip.open(os.path.join(tmp_dir, "out.txt.gz"), "rt", encoding="utf-8") as out_file:
+                self.assertEqual(out_file.read().count("ilişkisi"), 50)
+        self.assertEqual(threads, [])
+
+    def test_stdin(self):
+        code, stdout, _ = run_cli("-o", "tagged", "-n", "2", stdin="Parça ve bütün.\n<doc>\n".encode("utf-8"))
+        self.assertEqual((code, stdout.decode("utf-8")),
+                         (0, tokenize("Parça ve bütün.", "tagged") + "\n" + tokenize("<doc>", "tagged") + "\n"))
+        code, stdout, stderr = run_cli(stdin=b"")
+        self.assertEqual((code, stdout), (1, b""))
+        self.assertIn(b"No input received from stdin", stderr)
+        # A file argument wins over piped input
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "in.txt")
+            with open(path, "w", encoding="utf-8") as in_file:
+                in_file.write("Parça ve bütün.\n")
+            code, stdout, _ = run_cli(path, "-n", "2", stdin="İlişkisi.\n".encode("utf-8"))
+        self.assertEqual((code, stdout.decode("utf-8")), (0, tokenize("Parça ve bütün.", "tokenized") + "\n"))
+
+    def test_compressed_stdin(self):
+        # Long enough that the decompressing thread still waits for stdin when the workers are started
+        words = ["Merhaba", "dünya", "nasılsın", "İstanbul", "kitap", "güzel", "#etiket", "@kişi",
+                 "www.ornek.com"]
+        choice = random.Random(0).choice
+        text = "".join(" ".join(choice(words) for _ in range(12)) + ".\n" for _ in range(3000))
+        code, plain, _ = run_cli("-n", "2", stdin=text.encode("utf-8"))
+        self.assertEqual(code, 0)
+        # Workers forked while the thread that decompresses stdin held its lock hung
+        for start_method in set(multiprocessing.get_all_start_methods()) & {"fork", "forkserver"}:
+            result = run_cli("-n", "2", "--start-method", start_method, stdin=gzip.compress(text.encode("utf-8")))
+            self.assertEqual(result[:2], (0, plain))
+
+    def test_unordered_output(self):
+        # Chunks that finish early are yielded first, each with its sequence number
+        def slow_len(chunk):
+            time.sleep(0.02 * (chunk[0] % 3 == 0))
+            return len(chunk)
+
+        chunks = [[i, i] for i in range(12)]
+        with create_executor(4, backend="thread") as executor:
+            results = list(run_chunks(executor, slow_len, chunks, max_in_flight=4, ordered=False))
+        self.assertNotEqual([seq for seq, _, _ in results], list(range(12)))
+        self.assertEqual(sorted(results), [(seq, chunk, 2) for seq, chunk in enumerate(chunks)])
+        # Unordered output sorted by sequence number is the ordered output
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "in.txt")
+            with open(path, "w", encoding="utf-8") as in_file:
+                in_file.write("".join(f"Parça ve bütün ilişkisi {i}.\n<doc>\n\n" for i in range(40)))
+            outputs = {}
+            for ordered in (True, False):
+                outputs[ordered] = os.path.join(tmp_dir, f"out-{ordered}.txt")
+                TSTokenizer.ts_tokenize(filename=path, output_file=outputs[ordered], output_format="tagged",
+                                        num_workers=3, chunk_size=4, ordered=ordered)
+            with open(outputs[True], encoding="utf-8") as out_file:
+                expected = out_file.read().splitlines()
+            with open(outputs[False], encoding="utf-8") as out_file:
+                lines = sorted(out_file.read().splitlines(), key=lambda line: int(line.split("\t", 1)[0]))
+        self.assertEqual([line.split("\t", 1)[1] for line in lines], expected)
+
+    def test_token_spans(self):
+        # Quote-wrapped, apostrophed, bracketed and hyphenated words are split again after the first split
+        for word in ['"evlerimizde"', "İstanbul-Ankara'daki", "(kitap),", "Parça-bütün-ilişkisi.", "bütün'ün..."]:
+            line = "Önce " + word
+            spans = TokenProcessor.process_token_spans(word, start=5)
+            expected = TokenProcessor.process_token(word)
+            self.assertEqual([span[:2] for span in spans], expected)
+            for token, _, start, end in spans:
+                self.assertEqual(line[start:end], token)
+            self.assertEqual((spans[0][2], spans[-1][3]), (5, len(line)))
+        # Tokens that CharFix changed are not found in the input
+        spans = TokenProcessor.process_token_spans("«parça»")
+        self.assertEqual([(start, end) for _, _, start, end in spans], [(None, None), (1, 6), (None, None)])
+
+    def test_tokenizer_instance(self):
+        lines = ["Parça ve bütün ilişkisi.", "<doc>"]
+        with TSTokenizer(num_workers=1, output_format="tagged") as tokenizer:
+            self.assertEqual(tokenizer.tokenize_lines(lines), [tokenize(line, "tagged") for line in lines])
+            self.assertEqual(list(tokenizer.iter_tokenize(lines)), list(iter_tokenize(lines)))
+
+    def test_backends(self):
+        lines = ["Parça ve bütün ilişkisi.", "<doc>", "Parça ve bütün."]
+        for backend in ("serial", "thread"):
+            with TSTokenizer(num_workers=2, output_format="tagged", backend=backend) as tokenizer:
+                self.assertEqual(tokenizer.tokenize_lines(lines), [tokenize(line, "tagged") for line in lines])
+
+    def test_document_chunks(self):
+        lines = ["<doc>\n", "<p>\n", "Bir.\n", "</p>\n", "<p>\n", "İki.\n", "</p>\n", "</doc>\n",
+                 "<doc>\n", "Üç.\n", "</doc>\n"]
+        self.assertEqual(list(document_chunks(lines, 100)), [lines])
+        # The first document is split at its second paragraph, the second one is kept whole
+        self.assertEqual(list(document_chunks(lines, 10)), [lines[:4], lines[4:8], lines[8:]])
+
+    def test_conllu_vrt(self):
+        conllu = tokenize("Parça ve bütün ilişkisi.", "conllu").splitlines()
+        self.assertEqual(conllu[0], "# text = Parça ve bütün ilişkisi.")
+        self.assertEqual(conllu[4].split("\t")[:2] + conllu[4].split("\t")[9:], ["4", "ilişkisi", "SpaceAfter=No"])
+        self.assertEqual(conllu[5].split("\t")[:2] + conllu[5].split("\t")[9:], ["5", ".", "_"])
+
+        vrt = tokenize_chunk(['<doc id="d1">\n', "Parça ve bütün.\n", "</doc>\n"], "vrt").splitlines()
+        self.assertEqual(vrt[:2] + vrt[-2:], ['<doc id="d1">', '<s id="14">', "</s>", "</doc>"])
+
+    def test_token_ids(self):
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = os.path.join(directory, "ids")
+            with TokenIdWriter(prefix) as writer:
+                writer.write(tokenize_chunk(["Parça ve bütün.\n", "ve ve\n"], "ids"))
+            with open(prefix + ".vocab.tsv", encoding="utf-8") as vocab_file:
+                self.assertEqual(vocab_file.read(), "0\tParça\t1\n1\tve\t3\n2\tbütün\t1\n3\t.\t1\n")
+            with open(prefix + "-00000.offsets.npy", "rb") as offsets_file:
+                data = offsets_file.read()
+            self.assertTrue(data.startswith(b"\x93NUMPY"))
+            self.assertEqual(data[-24:], array('q', [0, 4, 6]).tobytes())
+
+    def test_jsonl(self):
+        line = 'Parça "ve" bütün\\ilişkisi.'
+        tokens = tokenize(line, "tagged_lines")
+        self.assertEqual(tokenize(line, "tagged", output=True),
+                         json.dumps([{"token": token, "tag": tag} for token, tag in tokens], ensure_ascii=False))
+        self.assertEqual(tokenize(line, "lines", output=True),
+                         json.dumps({"tokens": [token for token, _ in tokens]}, ensure_ascii=False))
+
+    def test_spans(self):
+        line = "  parça&amp;bütün “ilişkisi”…"
+        spans = tokenize(line, "spans")
+        fixed = CharFix.fix(line)
+        self.assertEqual([(span.token, span.tag) for span in spans], tokenize(fixed, "tagged_lines"))
+        for span in spans:
+            self.assertEqual(fixed[span.start:span.end], span.token)
+        self.assertEqual([line[span.raw_start:span.raw_end] for span in spans][:3], ["parça", "&amp;", "bütün"])
+
+    def test_token_batch(self):
+        lines = ["Parça ve bütün ilişkisi.", "", "<doc>", "Parça, ve bütün."]
+        batch = next(iter_token_batches(lines, workers=2))
+        self.assertEqual(batch.tolist(), list(iter_tokenize(lines)))
+        self.assertEqual(pickle.loads(pickle.dumps(batch)).tolist(), batch.tolist())
+        self.assertEqual(len(batch), 4)
+        self.assertEqual((batch[2][0].token, batch[2][0].tag), ("<doc>", Tag.XML_Tag))
+
+    def test_token_cache(self):
+        line = "Parça, ve bütün'ün ilişkisi..."
+        size = TOKEN_CACHE.maxsize
+        try:
+            set_cache_size(0)
+            expected = tokenize(line, "tagged")
+            set_cache_size(size)
+            hits = TOKEN_CACHE.hits
+            self.assertEqual([tokenize(line, "tagged") for _ in range(2)], [expected] * 2)
+            self.assertGreater(TOKEN_CACHE.hits, hits)
+        finally:
+            set_cache_size(size)
+        # The size given to a call or a tokenizer is restored afterwards
+        TSTokenizer.ts_tokenize(input_file=line, backend="serial", cache_size=size + 1, output_file=os.devnull)
+        self.assertEqual(TOKEN_CACHE.maxsize, size)
+        with TSTokenizer(backend="serial", cache_size=size + 2) as tokenizer:
+            tokenizer.tokenize_lines([line])
+            self.assertEqual(TOKEN_CACHE.maxsize, size + 2)
+        self.assertEqual(TOKEN_CACHE.maxsize, size)
+
+    def test_disk_cache(self):
+        line = "Bütünlüğünü'nden parçasızlık."
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "analyses.sqlite")
+            with TSTokenizer(backend="serial", output_format="tagged", disk_cache=path) as tokenizer:
+                self.assertEqual(tokenizer.tokenize_lines([line]), [tokenize(line, "tagged")])
+            # The cache file is used by the tokenizer only
+            self.assertEqual((TOKEN_CACHE.store, disk_cache_path()), (None, None))
+            TSTokenizer.ts_tokenize(input_file=line, backend="serial", disk_cache=path, output_file=os.devnull)
+            self.assertEqual((TOKEN_CACHE.store, disk_cache_path()), (None, None))
+            connection = sqlite3.connect(path)
+            analyses = dict(connection.execute("SELECT token, result FROM analyses"))
+            connection.close()
+        self.assertIn(".", analyses)
+        self.assertEqual(decode_result(analyses["parçasızlık."]), TokenProcessor.process_token("parçasızlık."))
+
+    def test_signature_dispatch(self):
+        checks = list(applicable_checks(regex, token_signature("evlerimizdekiler")))
+        self.assertNotIn(TokenPreProcess.is_ip_address, checks)
+        self.assertNotIn(TokenPreProcess.is_date, checks)
+        self.assertIn(TokenPreProcess.is_roman_number, checks)
+        self.assertIn(TokenPreProcess.is_date, list(applicable_checks(regex, token_signature("12.05.2020"))))
+        self.assertEqual(TokenProcessor.process_regex("12.05.2020"), [("12.05.2020", "Date")])
+
+    def test_token_context(self):
+        context = TokenContext("&quot;EVLER&quot;")
+        self.assertEqual(context.fixed, '"EVLER"')
+        self.assertIs(context.fixed, context.fixed)
+        self.assertEqual(context.fixed.lower, '"evler"')
+        result = TokenProcessor.process_token_uncached(context)
+        self.assertEqual(result, TokenProcessor.process_token_uncached("&quot;EVLER&quot;"))
+        self.assertTrue(all(type(token) is str for token, _ in result))
+
+    def test_atokenize(self):
+        lines = ["Parça ve bütün ilişkisi.", "<doc>", "Parça ve bütün."]
+
+        async def run():
+            async with AsyncTokenizer(num_workers=1) as tokenizer:
+                return await asyncio.gather(*(tokenizer.tokenize(line, "tagged") for line in lines))
+
+        self.assertEqual(asyncio.run(run()), [tokenize(line, "tagged") for line in lines])
+
+    def test_server(self):
+        async def request(reader, writer, head, body=b""):
+            writer.write(head.encode("latin-1") + b"\r\n\r\n" + body)
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while (header := await reader.readline()) != b"\r\n":
+                name, _, value = header.decode("latin-1").partition(":")
+                headers[name.lower()] = value.strip()
+            return status, headers, await reader.readexactly(int(headers["content-length"]))
+
+        async def run():
+            server = TokenizerServer(num_workers=1, backend="thread")
+            listener = await server.start("127.0.0.1", 0)
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", listener.sockets[0].getsockname()[1])
+                body = json.dumps({"lines": ["Merhaba dünya."]}).encode("utf-8")
+                # Two requests on one connection
+                first = await request(reader, writer, "POST /tokenize HTTP/1.1\r\nContent-Type: application/json\r\n"
+                                                      f"Content-Length: {len(body)}", body)
+                second = await request(reader, writer, "GET /health HTTP/1.1")
+                chunked = await request(reader, writer, "POST /tokenize HTTP/1.1\r\nTransfer-Encoding: chunked",
+                                        b"5\r\nabcde\r\n0\r\n\r\n")
+                closed = await reader.read()
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", listener.sockets[0].getsockname()[1])
+                gzipped = await request(reader, writer, "POST /tokenize HTTP/1.1\r\nTransfer-Encoding: gzip")
+                writer.close()
+                # Request heads that are too long are answered too, and the connection is closed
+                heads = ["GET /health HTTP/1.1\r\nX-Long: " + "a" * 70000,
+                         "GET /health HTTP/1.1" + "".join(f"\r\nX-Header-{i}: {i}" for i in range(101)),
+                         "GET /" + "a" * 70000 + " HTTP/1.1"]
+                too_long = []
+                for head in heads:
+                    reader, writer = await asyncio.open_connection("127.0.0.1", listener.sockets[0].getsockname()[1])
+                    status, headers, _ = await request(reader, writer, head)
+                    too_long.append((status, headers["connection"]))
+                    writer.close()
+                return first, second, chunked, closed, gzipped, too_long
+            finally:
+                listener.close()
+                await listener.wait_closed()
+                server.tokenizer.close()
+
+        first, second, chunked, closed, gzipped, too_long = asyncio.run(run())
+        self.assertEqual(first[0], 200)
+        self.assertEqual(first[1]["connection"], "keep-alive")
+        tagged = [line.split("\t") for line in tokenize("Merhaba dünya.", "tagged").splitlines()]
+        self.assertEqual(json.loads(first[2])["results"], [tagged])
+        self.assertEqual((second[0], json.loads(second[2])), (200, {"status": "ok"}))
+        self.assertEqual((chunked[0], chunked[1]["connection"], closed), (411, "close", b""))
+        self.assertEqual(gzipped[0], 501)
+        self.assertEqual(too_long, [(431, "close"), (431, "close"), (414, "close")])
+
+    def test_server_socket(self):
+        if not hasattr(socket, "AF_UNIX"):
+            return
+
+        async def run(path):
+            server = TokenizerServer(num_workers=1, backend="thread")
+            try:
+                listener = await server.start(socket_path=path)
+                listening = is_socket(path)
+                listener.close()
+                await listener.wait_closed()
+                return listening
+            finally:
+                server.tokenizer.close()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Another file at the socket path is kept
+            path = os.path.join(tmp_dir, "data.txt")
+            with open(path, "w", encoding="utf-8") as data_file:
+                data_file.write("data")
+            with self.assertRaises(FileExistsError):
+                asyncio.run(run(path))
+            with open(path, encoding="utf-8") as data_file:
+                self.assertEqual(data_file.read(), "data")
+            # A socket left behind is replaced
+            path = os.path.join(tmp_dir, "server.sock")
+            stale = socket.socket(socket.AF_UNIX)
+            stale.bind(path)
+            stale.close()
+            self.assertTrue(asyncio.run(run(path)))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,190 @@
+import gc
+import sys
+import logging
+import threading
+import contextlib
+import multiprocessing
+import concurrent.futures
+from importlib import import_module
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from ts_tokenizer.token_cache import TOKEN_CACHE, set_cache_size
+from ts_tokenizer.disk_cache import attach_disk_cache, disk_cache_path, flush_disk_cache
+
+# Modules whose import builds the lexicon sets and compiles the regex tables
+PRELOAD_MODULES = ["ts_tokenizer.token_handler"]
+
+# Execution backends, see create_executor()
+BACKENDS = ["process", "thread", "interpreter", "serial"]
+DEFAULT_BACKEND = "process"
+
+
+def preload():
+    """
+    Loads the lexicons in the current process, so that forked workers inherit them instead of loading their own.
+    """
+    load_lexicons()
+
+
+@contextlib.contextmanager
+def frozen_objects():
+    """
+    Moves every object that exists so far into the permanent generation of the garbage collector while
+    workers are forked, and back on exit. Collections in the forked workers then never write to the pages
+    that hold the lexicons, so those pages stay shared with the parent instead of being copied into every
+    worker, while the collector of this process is left as it was. A process that froze objects itself
+    is left alone.
+    """
+    if gc.get_freeze_count():
+        yield
+        return
+    gc.freeze()
+    try:
+        yield
+    finally:
+        gc.unfreeze()
+
+
+def load_lexicons():
+    """
+    Imports the modules that build the lexicons, a no-op when they are loaded already.
+    """
+    for module in PRELOAD_MODULES:
+        import_module(module)
+
+
+def init_worker(cache_size=None, disk_cache=None):
+    """
+    Worker initializer. Freezes the objects inherited from the parent or the fork server before the first
+    collection in the worker, then makes sure the lexicons are loaded (a no-op unless workers are spawned).
+    """
+    gc.freeze()
+    configure_worker(cache_size, disk_cache)
+
+
+def configure_worker(cache_size=None, disk_cache=None):
+    """
+    Loads the lexicons and gives the token cache of the worker the size and the cache file of the parent's.
+    """
+    load_lexicons()
+    if cache_size is not None:
+        set_cache_size(cache_size)
+    if disk_cache:
+        attach_disk_cache(disk_cache)
+
+
+def worker_context(start_method=None):
+    """
+    Returns the multiprocessing context for the workers. Without a start method, the one the program set with
+    multiprocessing.set_start_method() is used, or else the platform default, except that forkserver is
+    preferred where it exists over a default of spawn, so that workers are forked from a server that loaded
+    the lexicons once instead of every worker loading its own copy, and over a default of fork while other
+    threads are running, since a lock held by one of them when the workers are forked stays held in every
+    worker.
+    """
+    threads = threading.active_count() > 1
+    if start_method is None:
+        # Without fixing the start method of the program, which it may still set itself
+        start_method = multiprocessing.get_start_method(allow_none=True)
+        if start_method is None:
+            start_method = multiprocessing.get_all_start_methods()[0]
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                if start_method == 'spawn':
+                    logging.info("Starting workers with forkserver instead of the platform default spawn")
+                    start_method = 'forkserver'
+                elif start_method == 'fork' and threads:
+                    logging.info("Starting workers with forkserver instead of fork, other threads are running")
+                    start_method = 'forkserver'
+    if start_method == 'fork' and threads:
+        logging.warning("Forking workers while other threads are running, a worker may block on a lock that one "
+                        "of them held")
+
+    context = multiprocessing.get_context(start_method)
+    if start_method == 'fork':
+        # Workers inherit the parent's lexicons, copy-on-write
+        preload()
+    elif start_method == 'forkserver':
+        context.set_forkserver_preload(PRELOAD_MODULES)
+    else:
+        logging.debug(f"Workers started with {start_method} load their own copy of the lexicons")
+    return context
+
+
+class SerialExecutor(Executor):
+    """
+    Executor that runs every task in the calling thread as soon as it is submitted. Useful for debugging,
+    profiling and small inputs, where starting workers costs more than it saves.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def available_backends():
+    """
+    Returns the backends that can be used with this Python. The interpreter backend needs Python 3.14+.
+    """
+    return [backend for backend in BACKENDS
+            if backend != "interpreter" or hasattr(concurrent.futures, "InterpreterPoolExecutor")]
+
+
+def create_executor(num_workers, start_method=None, backend=DEFAULT_BACKEND):
+    """
+    Creates the executor used for tokenization:
+
+    process      worker processes that share one copy of the lexicons (the default)
+    thread       worker threads of this process. Only faster than serial on a free-threaded Python build,
+                 otherwise the threads take turns holding the GIL
+    interpreter  subinterpreters in worker threads, each with its own GIL and its own copy of the lexicons
+    serial       every chunk is tokenized in the calling thread
+
+    Worker processes and subinterpreters get a token cache of the size of this process's and the same
+    cache file, see set_disk_cache(); thread and serial workers share this process's cache.
+    """
+    if backend == "process":
+        context = worker_context(start_method)
+        executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=init_worker,
+                                       initargs=(TOKEN_CACHE.maxsize, disk_cache_path()))
+        if context.get_start_method() == 'fork':
+            # The first task forks every worker, with the inherited objects frozen
+            with frozen_objects():
+                executor.submit(load_lexicons)
+        return executor
+    if backend == "thread":
+        if getattr(sys, "_is_gil_enabled", lambda: True)():
+            logging.info("The GIL is enabled, worker threads will not tokenize in parallel")
+        configure_worker(disk_cache=disk_cache_path())
+        return ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="ts-tokenizer")
+    if backend == "interpreter":
+        if not hasattr(concurrent.futures, "InterpreterPoolExecutor"):
+            raise ValueError("The interpreter backend needs Python 3.14 or later")
+        return concurrent.futures.InterpreterPoolExecutor(max_workers=num_workers, initializer=configure_worker,
+                                                          initargs=(TOKEN_CACHE.maxsize, disk_cache_path()))
+    if backend == "serial":
+        configure_worker(disk_cache=disk_cache_path())
+        return SerialExecutor()
+    raise ValueError(f"Unknown backend: {backend}. Available backends: {', '.join(BACKENDS)}")
+
+
+@contextlib.contextmanager
+def use_executor(executor=None, num_workers=1, start_method=None, backend=DEFAULT_BACKEND):
+    """
+    Yields the given executor, which stays open, or a new one that is shut down on exit.
+    """
+    if executor is not None:
+        yield executor
+        return
+    with create_executor(num_workers, start_method, backend) as executor:
+        yield executor
+    # Workers in other processes wrote their new analyses when they exited
+    flush_disk_cache()
+
+
+__all__ = ["create_executor", "use_executor", "available_backends", "worker_context", "preload", "frozen_objects",
+           "init_worker", "configure_worker", "load_lexicons", "SerialExecutor", "BACKENDS", "DEFAULT_BACKEND",
+           "PRELOAD_MODULES"]